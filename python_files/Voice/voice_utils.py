@@ -1,32 +1,59 @@
-import os, tempfile, torch
+import os
+from concurrent.futures import TimeoutError as FuturesTimeout
+
 import streamlit as st
 
+from empathybot.stt import AudioDecodeError, STTService, decode_audio, load_stt_backend
+from empathybot.util import QueueFull
+from empathybot.voice_stream import prewarm, trim_silence
+
 @st.cache_resource(show_spinner=False)
-def load_stt(model_size: str | None = None):
+def load_stt(model_size: str | None = None, backend: str | None = None):
     """
-    Load OpenAI Whisper once and cache it.
+    Load the Whisper STT service once and cache it.
     Sizes: tiny, base, small, medium, large. Default: 'base'.
     Set env WHISPER_SIZE=small if you have GPU.
+    Backend: 'whisper' (torch) or 'ct2' (faster-whisper, int8 on CPU); env EMPATHYBOT_STT_BACKEND.
+    Workers / queue bound: env STT_WORKERS (default 1), STT_MAX_QUEUE (default 8).
     """
-    import whisper
     size = model_size or os.environ.get("WHISPER_SIZE", "base")
-    return whisper.load_model(size)
+    backend = backend or os.environ.get("EMPATHYBOT_STT_BACKEND", "whisper")
+    workers = int(os.environ.get("STT_WORKERS", "1"))
+    return STTService(load_stt_backend(backend, size, workers=workers), workers=workers,
+                      max_queue=int(os.environ.get("STT_MAX_QUEUE", "8")))
 
-def transcribe_audio_bytes(audio_bytes: bytes, model) -> str:
+def transcribe_audio_bytes(audio_bytes: bytes, model, timeout: float | None = 60.0) -> str:
     """
-    Persist bytes to a temp .wav and transcribe via Whisper.
-    Returns a plain text transcript ('' on failure).
+    Decode the recorder bytes in memory, drop silence (VAD) and transcribe on the STT worker pool.
+    Returns a plain text transcript; '' for silence, undecodable audio, a full queue or a timeout
+    (logged). Model errors propagate.
     """
     if not audio_bytes:
         return ""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        tmp.write(audio_bytes)
-        tmp_path = tmp.name
     try:
-        result = model.transcribe(tmp_path, fp16=torch.cuda.is_available())
-        return (result.get("text") or "").strip()
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+        speech = trim_silence(decode_audio(audio_bytes))
+    except AudioDecodeError as e:
+        print("Could not decode recording:", e)
+        return ""
+    if not len(speech):
+        return ""
+    try:
+        return model.transcribe(speech, timeout=timeout)
+    except QueueFull:
+        print("Transcription queue is full; dropping recording")
+        return ""
+    except FuturesTimeout:
+        print(f"Transcription timed out after {timeout}s")
+        return ""
+
+def prewarm_async(text: str):
+    """Start emotion detection + retrieval for a transcript in the background (fills the runtime caches)."""
+    import threading
+    if text:
+        threading.Thread(target=lambda: _quiet(prewarm, text), daemon=True).start()
+
+def _quiet(fn, *args):
+    try:
+        fn(*args)
+    except Exception:
+        pass
@@ -0,0 +1,18 @@
+"""EmpathyBot runtime: emotion detection → template retrieval → few-shot reply."""
+from .text import clean_text, keywords
+from .runtime import (
+    init, respond, respond_many, configure_caches, cache_stats, configure_routing, route_stats,
+    configure_memory, memory_stats, forget_session, reload_retriever,
+    get_detector, get_retriever, get_generator,
+    detect_emotion_label_and_conf, retrieve_top3,
+)
+from .streaming import respond_stream, arespond_stream
+
+__all__ = [
+    "clean_text", "keywords",
+    "init", "respond", "respond_many", "respond_stream", "arespond_stream",
+    "configure_caches", "cache_stats", "configure_routing", "route_stats",
+    "configure_memory", "memory_stats", "forget_session", "reload_retriever",
+    "get_detector", "get_retriever", "get_generator",
+    "detect_emotion_label_and_conf", "retrieve_top3",
+]
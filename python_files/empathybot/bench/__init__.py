@@ -0,0 +1,71 @@
+"""Shared helpers for the benchmark scripts (python -m empathybot.bench.<name>)."""
+import json, multiprocessing as mp, os, random, resource, statistics, sys, time
+from pathlib import Path
+
+from ..config import DATA_DIR, REPO_DATA_DIR
+from ..util import percentile
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024   # bytes on macOS, KiB on Linux
+
+def latency_summary(seconds: list[float]) -> dict:
+    """p50/p90/p99/mean in milliseconds (nearest-rank percentiles)."""
+    if not seconds:
+        return {}
+    return {"n": len(seconds), "mean_ms": round(statistics.fmean(seconds) * 1000, 3),
+            **{f"p{q}_ms": round(percentile(seconds, q) * 1000, 3) for q in (50, 90, 99)}}
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+def sample_rows(n: int = 200, seed: int = 0, columns=("text_raw", "label_4")) -> list[dict]:
+    """Fixed, seeded sample of tweet_eval rows (prepared data dir, else the copy shipped in Data/)."""
+    import pandas as pd
+
+    for p in (DATA_DIR / "tweet_eval_emotion_merged_clean.parquet",
+              REPO_DATA_DIR / "tweet_eval_emotion_clean.parquet"):
+        if p.exists():
+            df = pd.read_parquet(p, columns=list(columns)).dropna()
+            break
+    else:
+        raise FileNotFoundError("No tweet_eval parquet found; run `python -m empathybot.prep tweet-eval`.")
+    rows = df.astype(str).to_dict("records")
+    return random.Random(seed).sample(rows, min(n, len(rows)))
+
+def sample_messages(n: int = 200, seed: int = 0, column: str = "text_raw") -> list[str]:
+    return [r[column] for r in sample_rows(n, seed, columns=(column,))]
+
+def write_json(path: Path | None, payload: dict):
+    text = json.dumps(payload, indent=2, ensure_ascii=False)
+    if path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(text, encoding="utf-8")
+        print("Wrote", path)
+    print(text)
+
+def _child(fn, args, q):
+    try:
+        q.put(fn(*args))
+    except Exception as e:   # surface the failure instead of hanging on q.get()
+        q.put({"error": f"{type(e).__name__}: {e}"})
+
+def run_isolated(fn, *args) -> dict:
+    """Run fn(*args) in a fresh spawned process (clean RSS / load-time numbers); fn must return a dict."""
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_child, args=(fn, args, q))
+    p.start()
+    res = q.get()
+    p.join()
+    return res
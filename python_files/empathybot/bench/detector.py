@@ -0,0 +1,69 @@
+"""
+Detector backend benchmark: torch pipeline vs ONNX Runtime (fp32 / int8).
+
+    python -m empathybot.bench.detector --n 300 --batch-size 16 --out bench_detector.json
+
+Each backend runs in its own spawned process so load time and RSS are not
+shared. Scores are compared against the torch backend (max |Δ| per label and
+top-label agreement); --atol sets the pass/fail tolerance.
+"""
+import argparse
+
+from . import latency_summary, peak_rss_mb, rss_mb, run_isolated, sample_messages, timed, write_json
+
+def _run_backend(backend: str, quantize: bool, texts: list[str], batch_size: int) -> dict:
+    from ..detector import EmotionDetector, OnnxEmotionDetector
+
+    rss0 = rss_mb()
+    det, load_s = timed(lambda: EmotionDetector() if backend == "torch" else OnnxEmotionDetector(quantize=quantize))
+    rss_loaded = rss_mb()
+    det.detect(texts[0])   # warm-up
+
+    single = []
+    for t in texts:
+        _, dt = timed(det.scores, t)
+        single.append(dt)
+    scores = [det.scores(t) for t in texts]
+    _, batch_s = timed(det.detect_many, texts, batch_size=batch_size)
+
+    return {
+        "load_s": round(load_s, 3),
+        "rss_model_mb": round(rss_loaded - rss0, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "single": latency_summary(single),
+        "batched_msgs_per_s": round(len(texts) / batch_s, 1),
+        "scores": scores,
+    }
+
+def compare_scores(ref: list[dict], cand: list[dict]) -> dict:
+    max_diff = max(abs(r[l] - c.get(l, 0.0)) for r, c in zip(ref, cand) for l in r)
+    agree = sum(max(r, key=r.get) == max(c, key=c.get) for r, c in zip(ref, cand)) / len(ref)
+    return {"max_abs_diff": round(max_diff, 5), "top_label_agreement": round(agree, 4)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.bench.detector")
+    ap.add_argument("--n", type=int, default=300)
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--atol", type=float, default=0.05, help="max allowed per-label score difference vs torch")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    texts = sample_messages(args.n)
+    results = {}
+    for name, backend, quantize in (("torch", "torch", False), ("onnx_fp32", "onnx", False), ("onnx_int8", "onnx", True)):
+        print("Running", name, "…")
+        results[name] = run_isolated(_run_backend, backend, quantize, texts, args.batch_size)
+
+    ref = results["torch"].pop("scores", None)
+    for name in ("onnx_fp32", "onnx_int8"):
+        cand = results[name].pop("scores", None)
+        if ref is None or cand is None:
+            continue
+        cmp = compare_scores(ref, cand)
+        cmp["within_atol"] = cmp["max_abs_diff"] <= args.atol
+        results[name]["vs_torch"] = cmp
+
+    write_json(args.out, {"n_messages": len(texts), "batch_size": args.batch_size, "atol": args.atol, "backends": results})
+
+if __name__ == "__main__":
+    main()
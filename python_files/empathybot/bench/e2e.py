@@ -0,0 +1,182 @@
+"""
+End-to-end respond() benchmark: cold start, per-stage latency, throughput, RSS.
+
+    python -m empathybot.bench.e2e --n 100 --concurrency 1 2 4 8 --out bench_e2e.json
+    python -m empathybot.bench.e2e --n 100 --baseline bench_e2e.json    # exit 1 on a regression
+
+Everything runs in one spawned process with HF_HUB_OFFLINE=1 (locally cached
+models only; --online to allow downloads) and the stage caches disabled, so
+repeated messages cost the same as new ones. Messages are a seeded sample of
+tweet_eval (same --n/--seed → same messages; their hash is in the output).
+
+    cold_start      import, detector/retriever/generator load, first respond()
+    stages          per message: clean, detect, retrieve, route, prompt, generate, postprocess
+                    (generate/prompt/postprocess only for generate-routed messages; --no-routing for all)
+    respond         respond() end to end, one message at a time
+    throughput      respond() from N threads at each --concurrency level, and respond_many()
+"""
+import argparse, hashlib, json, os, platform, sys, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import latency_summary, peak_rss_mb, rss_mb, run_isolated, sample_messages, timed, write_json
+
+STAGES = ("clean", "detect", "retrieve", "route", "prompt", "generate", "postprocess")
+
+def cold_start() -> dict:
+    t0 = time.perf_counter()
+    from .. import runtime
+    out = {"import_s": time.perf_counter() - t0}
+    rss0 = rss_mb()
+    for name, load in (("detector", runtime.get_detector), ("retriever", runtime.get_retriever),
+                       ("generator", runtime.get_generator)):
+        _, out[f"{name}_load_s"] = timed(load)
+    out["rss_loaded_mb"] = rss_mb()
+    out["rss_models_mb"] = out["rss_loaded_mb"] - rss0
+    _, out["first_respond_s"] = timed(runtime.respond, "I’m really down today. Nothing seems to work.")
+    out["total_s"] = time.perf_counter() - t0
+    return {k: round(v, 3) for k, v in out.items()}
+
+def stage_times(msgs: list[str], k: int = 3, decoding: str | None = None):
+    """respond()'s steps, timed one by one on the loaded components (no caches)."""
+    from .. import runtime
+    from ..generator import compose_from_templates, is_weak_reply, postprocess
+    from ..retriever import FALLBACKS
+    from ..routing import COMPOSE
+    from ..text import clean_text
+
+    det, ret, gen = runtime.get_detector(), runtime.get_retriever(), runtime.get_generator()
+    times = {s: [] for s in STAGES}
+    routes = Counter()
+    for m in msgs:
+        _, dt = timed(clean_text, m); times["clean"].append(dt)
+        (label, conf), dt = timed(det.detect, m); times["detect"].append(dt)
+        label, bucket = runtime._bucket_for(m, label, conf)
+        cands, dt = timed(ret.retrieve_top3, m, bucket, k=k); times["retrieve"].append(dt)
+        cands = cands or FALLBACKS[bucket][:k]
+        route, dt = timed(runtime.ROUTER.route, m, conf, bucket, cands, k); times["route"].append(dt)
+        if route == COMPOSE:
+            routes[route] += 1
+            continue
+        prompt, dt = timed(gen.build_prompt, m, bucket, cands); times["prompt"].append(dt)
+        raw, dt = timed(gen.generate, prompt, decoding=decoding); times["generate"].append(dt)
+        t0 = time.perf_counter()
+        final = postprocess(raw, m)
+        weak = is_weak_reply(final, m)
+        if weak:
+            compose_from_templates(bucket, cands)
+        times["postprocess"].append(time.perf_counter() - t0)
+        routes["generate_fallback" if weak else route] += 1
+    return {s: latency_summary(v) for s, v in times.items()}, dict(routes)
+
+def throughput(msgs: list[str], levels: list[int], batch_size: int, decoding: str | None = None) -> dict:
+    from .. import runtime
+
+    out = {}
+    for c in levels:
+        lat = []
+        def one(m):
+            _, dt = timed(runtime.respond, m, decoding=decoding)
+            lat.append(dt)
+        with ThreadPoolExecutor(max_workers=c) as pool:
+            _, wall = timed(lambda: list(pool.map(one, msgs)))
+        out[f"threads_{c}"] = {"msgs_per_s": round(len(msgs) / wall, 2), **latency_summary(lat)}
+    _, wall = timed(runtime.respond_many, msgs, batch_size=batch_size, decoding=decoding)
+    out[f"respond_many_{batch_size}"] = {"msgs_per_s": round(len(msgs) / wall, 2)}
+    return out
+
+def _run(msgs: list[str], levels: list[int], batch_size: int, routing: bool, decoding: str | None) -> dict:
+    cold = cold_start()
+    from .. import runtime
+    from ..config import DETECTOR_BACKEND, GEN_BACKEND
+
+    runtime.configure_caches(detect_size=0, retrieve_size=0, generate_size=0)
+    if not routing:
+        runtime.configure_routing(enabled=False)
+    stages, routes = stage_times(msgs, decoding=decoding)
+    single = []
+    for m in msgs:
+        _, dt = timed(runtime.respond, m, decoding=decoding)
+        single.append(dt)
+    return {
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                "detector_backend": DETECTOR_BACKEND, "gen_backend": GEN_BACKEND, "routing": routing,
+                "decoding": decoding},
+        "cold_start": cold,
+        "stages": stages,
+        "routes": routes,
+        "respond": latency_summary(single),
+        "throughput": throughput(msgs, levels, batch_size, decoding),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+# (section, key, value, higher_is_better) compared against --baseline
+def _metrics(res: dict):
+    for k, v in res.get("cold_start", {}).items():
+        if k.endswith("_s"):
+            yield "cold_start", k, v, False
+    for stage, summ in res.get("stages", {}).items():
+        if summ:
+            yield "stages", f"{stage}.p50_ms", summ["p50_ms"], False
+    for key in ("p50_ms", "p99_ms"):
+        if res.get("respond"):
+            yield "respond", key, res["respond"][key], False
+    for level, summ in res.get("throughput", {}).items():
+        yield "throughput", f"{level}.msgs_per_s", summ["msgs_per_s"], True
+    yield "memory", "peak_rss_mb", res.get("peak_rss_mb"), False
+
+def compare(base: dict, cur: dict, tolerance: float) -> list[dict]:
+    """
+    Relative change per metric; `regression` when worse than `tolerance` (0.2 = 20%)
+    and by more than timer noise (1 ms for latencies, 50 ms for load times).
+    """
+    old = {(s, k): v for s, k, v, _ in _metrics(base)}
+    rows = []
+    for sect, key, new, higher in _metrics(cur):
+        prev = old.get((sect, key))
+        if not prev or new is None:
+            continue
+        change = (new - prev) / prev
+        worse = -change if higher else change
+        floor = 1.0 if key.endswith("_ms") else 0.05 if key.endswith("_s") else 0.0
+        rows.append({"metric": f"{sect}.{key}", "baseline": prev, "current": new, "change": round(change, 4),
+                     "regression": worse > tolerance and abs(new - prev) > floor})
+    return rows
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.bench.e2e")
+    ap.add_argument("--n", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--concurrency", type=int, nargs="*", default=[1, 2, 4, 8])
+    ap.add_argument("--batch-size", type=int, default=16, help="respond_many() batch size")
+    ap.add_argument("--decoding", choices=["beam", "greedy"], default=None)
+    ap.add_argument("--no-routing", action="store_true", help="send every message to the generator")
+    ap.add_argument("--online", action="store_true", help="allow model downloads (default: local cache only)")
+    ap.add_argument("--baseline", default=None, help="earlier --out JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown vs --baseline")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    if not args.online:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    msgs = sample_messages(args.n, args.seed)
+    res = run_isolated(_run, msgs, args.concurrency, args.batch_size, not args.no_routing, args.decoding)
+    if "error" in res:
+        print("Benchmark failed:", res["error"], file=sys.stderr)
+        sys.exit(2)
+    payload = {"n_messages": len(msgs), "seed": args.seed,
+               "messages_sha1": hashlib.sha1("\n".join(msgs).encode("utf-8")).hexdigest(), **res}
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("messages_sha1") != payload["messages_sha1"]:
+            print("Warning: baseline used a different message set", file=sys.stderr)
+        payload["vs_baseline"] = compare(base, payload, args.tolerance)
+    write_json(args.out, payload)
+    if any(r["regression"] for r in payload.get("vs_baseline", [])):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
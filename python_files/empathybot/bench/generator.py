@@ -0,0 +1,97 @@
+"""
+Generation backend benchmark: HuggingFacePipeline (fp32, beam) vs QuantizedT5Engine.
+
+    python -m empathybot.bench.generator --n 60 --out bench_generator.json
+
+Prompts are built from a seeded tweet_eval sample with the bucket's FALLBACKS
+as templates (no retriever needed). Quality is measured against the
+HuggingFacePipeline replies after postprocess(): exact-match rate, mean token
+F1, and how often the reply is weak enough to be replaced by
+compose_from_templates().
+"""
+import argparse
+from collections import Counter
+
+from . import latency_summary, peak_rss_mb, rss_mb, run_isolated, sample_rows, timed, write_json
+
+VARIANTS = {
+    "hf_beam":            dict(backend="hf"),
+    "int8_beam":          dict(backend="int8", quantize=True, prefix_cache=False, decoding="beam"),
+    "int8_beam_prefix":   dict(backend="int8", quantize=True, prefix_cache=True, decoding="beam"),
+    "int8_greedy_prefix": dict(backend="int8", quantize=True, prefix_cache=True, decoding="greedy"),
+}
+
+def build_cases(n: int):
+    from ..retriever import FALLBACKS
+
+    # bucket from the dataset's own 4-class label keeps prompts realistic without the detector
+    return [(r["text_raw"], r["label_4"], FALLBACKS.get(r["label_4"], FALLBACKS["neutral"]))
+            for r in sample_rows(n, columns=("text_raw", "label_4"))]
+
+def _run_variant(spec: dict, cases: list, batch_size: int) -> dict:
+    from ..generator import QuantizedT5Engine, ReplyGenerator, is_weak_reply, postprocess
+
+    rss0 = rss_mb()
+    if spec["backend"] == "hf":
+        gen, load_s = timed(ReplyGenerator)
+        decoding = None
+    else:
+        gen, load_s = timed(QuantizedT5Engine, quantize=spec["quantize"], prefix_cache=spec["prefix_cache"])
+        decoding = spec["decoding"]
+    rss_loaded = rss_mb()
+
+    prompts = [gen.build_prompt(m, b, c) for m, b, c in cases]
+    gen.generate(prompts[0], decoding=decoding)   # warm-up (and prefix encoding)
+    raws, single = [], []
+    for p in prompts:
+        out, dt = timed(gen.generate, p, decoding=decoding)
+        raws.append(out); single.append(dt)
+    _, batch_s = timed(gen.generate_many, prompts, batch_size=batch_size, decoding=decoding)
+
+    replies = [postprocess(r, m) for r, (m, _, _) in zip(raws, cases)]
+    return {
+        "load_s": round(load_s, 3),
+        "rss_model_mb": round(rss_loaded - rss0, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "single": latency_summary(single),
+        "batched_msgs_per_s": round(len(prompts) / batch_s, 2),
+        "weak_reply_rate": round(sum(is_weak_reply(r, m) for r, (m, _, _) in zip(replies, cases)) / len(cases), 4),
+        "replies": replies,
+    }
+
+def token_f1(a: str, b: str) -> float:
+    ta, tb = a.lower().split(), b.lower().split()
+    if not ta and not tb: return 1.0
+    common = sum((Counter(ta) & Counter(tb)).values())
+    if not common: return 0.0
+    p, r = common / len(ta), common / len(tb)
+    return 2 * p * r / (p + r)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.bench.generator")
+    ap.add_argument("--n", type=int, default=60)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=list(VARIANTS))
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    cases = build_cases(args.n)
+    results = {}
+    for name in args.variants:
+        print("Running", name, "…")
+        results[name] = run_isolated(_run_variant, VARIANTS[name], cases, args.batch_size)
+
+    ref = results.get("hf_beam", {}).get("replies")
+    for name, res in results.items():
+        replies = res.pop("replies", None)
+        if ref is None or replies is None or name == "hf_beam":
+            continue
+        res["vs_hf_beam"] = {
+            "exact_match": round(sum(a == b for a, b in zip(ref, replies)) / len(ref), 4),
+            "mean_token_f1": round(sum(token_f1(a, b) for a, b in zip(ref, replies)) / len(ref), 4),
+        }
+
+    write_json(args.out, {"n_prompts": len(cases), "batch_size": args.batch_size, "variants": results})
+
+if __name__ == "__main__":
+    main()
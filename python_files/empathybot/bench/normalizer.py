@@ -0,0 +1,58 @@
+"""
+clean_text() golden check + microbenchmark.
+
+    python -m empathybot.bench.normalizer --repeat 5 --out bench_normalizer.json
+
+Golden: every text_raw in Data/tweet_eval_emotion_clean.csv must clean to the
+stored `text` column with clean_text(), clean_series() and the original regex
+chain (clean_text_reference). Exits non-zero on any mismatch. Timings compare
+the reference chain, clean_text() row by row and the vectorized clean_series().
+"""
+import argparse, sys
+
+from . import timed, write_json
+from ..config import REPO_DATA_DIR
+from ..text import clean_series, clean_text, clean_text_reference
+
+GOLDEN_CSV = REPO_DATA_DIR / "tweet_eval_emotion_clean.csv"
+
+def golden_mismatches(raw: list[str], expected: list[str], got: list[str], show: int = 5) -> dict:
+    bad = [(r, e, g) for r, e, g in zip(raw, expected, got) if e != g]
+    return {"mismatches": len(bad), "examples": [{"raw": r, "expected": e, "got": g} for r, e, g in bad[:show]]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.bench.normalizer")
+    ap.add_argument("--csv", default=str(GOLDEN_CSV))
+    ap.add_argument("--repeat", type=int, default=5, help="timing repetitions (best is reported)")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    import pandas as pd
+    df = pd.read_csv(args.csv, keep_default_na=False, dtype=str)
+    raw, expected = df["text_raw"].tolist(), df["text"].tolist()
+
+    golden = {
+        "reference": golden_mismatches(raw, expected, [clean_text_reference(t) for t in raw]),
+        "clean_text": golden_mismatches(raw, expected, [clean_text(t) for t in raw]),
+        "clean_series": golden_mismatches(raw, expected, clean_series(df["text_raw"]).tolist()),
+    }
+
+    variants = {
+        "reference": lambda: [clean_text_reference(t) for t in raw],
+        "clean_text": lambda: [clean_text(t) for t in raw],
+        "clean_series": lambda: clean_series(df["text_raw"]),
+    }
+    timings = {}
+    for name, fn in variants.items():
+        best = min(timed(fn)[1] for _ in range(args.repeat))
+        timings[name] = {"best_s": round(best, 4), "us_per_row": round(best / len(raw) * 1e6, 3)}
+    base = timings["reference"]["best_s"]
+    for t in timings.values():
+        t["speedup"] = round(base / t["best_s"], 2)
+
+    write_json(args.out, {"rows": len(raw), "golden": golden, "timings": timings})
+    if any(g["mismatches"] for g in golden.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Template retrieval benchmark: dense vs hybrid (BM25 + dense, RRF) — recall@3, fallback rate, latency.
+
+    python -m empathybot.bench.retrieval --n 300 --budgets 2 4 8 --out bench_retrieval.json
+
+recall@3     known-item queries: a seeded sample of corpus templates with `--drop`
+             of their words removed, searched in their own bucket; a hit is the
+             source template among the 3 returned.
+fallback     tweet_eval messages in their gold bucket: share of the 3 slots that
+             had to be topped up with FALLBACKS (no on-topic candidate left).
+latency      retrieve_top3() per message, and the search + pruning part alone
+             (query embeddings precomputed; the same for every configuration).
+
+Configurations are dense at its usual budget (BUCKET_FETCH) and hybrid at each
+--budgets value (candidates per ranking, × k). Locally cached models only
+unless --online.
+"""
+import argparse, os, random, sys
+
+from . import latency_summary, sample_rows, timed, write_json
+
+def known_item_queries(ret, n: int, drop: float, seed: int) -> list[tuple[str, str, str]]:
+    """(query, bucket, source template) for n eligible templates with words dropped."""
+    rng = random.Random(seed)
+    rows = sorted(ret.table.eligible)
+    out = []
+    for row in rng.sample(rows, min(n, len(rows))):
+        words = ret.table.texts[row].split()
+        keep = [w for w in words if rng.random() >= drop]
+        if len(keep) < 3:
+            keep = words[:3]
+        out.append((" ".join(keep), ret.index.emotions[row], ret.table.texts[row]))
+    return out
+
+def evaluate(ret, mode: str, fetch: int, items, msgs, k: int = 3) -> dict:
+    from ..retriever import FALLBACKS, select_templates
+
+    ret.mode, ret.fetch = mode, fetch
+    found = sum(src in ret.retrieve_top3(q, emo, k=k) for q, emo, src in items)
+
+    fallback_lines = {fb for lines in FALLBACKS.values() for fb in lines}
+    topped = 0
+    lat, search = [], []
+    texts = [m for m, _ in msgs]
+    queries = ret.embed_queries(texts)
+    for i, (m, emo) in enumerate(msgs):
+        out, dt = timed(ret.retrieve_top3, m, emo, k=k)
+        lat.append(dt)
+        topped += sum(t in fallback_lines for t in out)
+        _, dt = timed(lambda: select_templates(ret._hits(queries[i:i + 1], [emo], k, [m])[0], ret.table, m, emo, k=k))
+        search.append(dt)
+    return {"mode": mode, "fetch": fetch, "candidates_per_ranking": k * fetch,
+            "recall_at_3": round(found / len(items), 4) if items else None,
+            "fallback_rate": round(topped / (k * len(msgs)), 4) if msgs else None,
+            "retrieve": latency_summary(lat), "search": latency_summary(search)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.bench.retrieval")
+    ap.add_argument("--n", type=int, default=300, help="known-item queries and tweet_eval messages each")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--drop", type=float, default=0.3, help="fraction of template words removed per query")
+    ap.add_argument("--budgets", type=int, nargs="*", default=[2, 4, 8], help="hybrid candidates per ranking (× k)")
+    ap.add_argument("--online", action="store_true", help="allow model downloads (default: local cache only)")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    if not args.online:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    from ..retriever import BUCKET_FETCH, TemplateRetriever
+
+    try:
+        ret = TemplateRetriever(mode="dense")
+    except Exception as e:
+        print("Benchmark failed:", f"{type(e).__name__}: {e}", file=sys.stderr)
+        sys.exit(2)
+    items = known_item_queries(ret, args.n, args.drop, args.seed)
+    msgs = [(r["text_raw"], r["label_4"]) for r in sample_rows(args.n, args.seed)]
+    ret.retrieve_top3("warm up", "neutral")
+
+    runs = [evaluate(ret, "dense", BUCKET_FETCH, items, msgs)]
+    runs += [evaluate(ret, "hybrid", b, items, msgs) for b in args.budgets]
+    write_json(args.out, {"n_known_item": len(items), "n_messages": len(msgs), "seed": args.seed,
+                          "drop": args.drop, "runs": runs})
+
+if __name__ == "__main__":
+    main()
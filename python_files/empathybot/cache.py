@@ -0,0 +1,147 @@
+"""
+Bounded, TTL-aware LRU caches for the respond() stages.
+
+Each stage cache has a `version` (detector model, corpus fingerprint, generator
+settings). Keys are only valid for the version they were written under;
+set_version() drops the in-memory entries and purges older rows from the
+optional on-disk SQLite store.
+"""
+import hashlib, pickle, sqlite3, threading, time
+from collections import OrderedDict
+from pathlib import Path
+
+_MISSING = object()
+
+def _disk_key(key) -> str:
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+class SQLiteStore:
+    """Tiny persistent key/value store shared by several named caches (one table)."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " ns TEXT, version TEXT, key TEXT, value BLOB, expires REAL,"
+            " PRIMARY KEY (ns, key))")
+
+    def get(self, ns: str, version: str, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM cache WHERE ns=? AND key=? AND version=?",
+                (ns, key, version)).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires = row
+        if expires is not None and expires < time.time():
+            return _MISSING
+        return pickle.loads(value)
+
+    def put(self, ns: str, version: str, key: str, value, ttl: float | None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (ns, version, key, value, expires) VALUES (?,?,?,?,?)",
+                (ns, version, key, pickle.dumps(value), expires))
+
+    def purge(self, ns: str, keep_version: str | None = None):
+        with self._lock:
+            if keep_version is None:
+                self._db.execute("DELETE FROM cache WHERE ns=?", (ns,))
+            else:
+                self._db.execute("DELETE FROM cache WHERE ns=? AND version<>?", (ns, keep_version))
+            self._db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL, hit/miss stats and an optional disk tier."""
+
+    def __init__(self, name: str, maxsize: int = 4096, ttl: float | None = None,
+                 store: SQLiteStore | None = None, version: str = ""):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.version = version
+        self.enabled = maxsize > 0
+        self._data: OrderedDict = OrderedDict()   # key -> (expires_monotonic | None, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def set_version(self, version: str):
+        """Switch to a new model/corpus version; entries from other versions become invalid."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._data.clear()
+        if self.store is not None:
+            self.store.purge(self.name, keep_version=version)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.purge(self.name)
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires, value = item
+                if expires is not None and expires < time.monotonic():
+                    del self._data[key]
+                    self._stats["expired"] += 1
+                else:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+        if self.store is not None:
+            value = self.store.get(self.name, self.version, _disk_key(key))
+            if value is not _MISSING:
+                self._remember(key, value)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return value
+        with self._lock:
+            self._stats["misses"] += 1
+        return default
+
+    def _remember(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def put(self, key, value, version: str | None = None):
+        """Store `value`; with `version` (read before computing it), skip if set_version() ran meanwhile."""
+        if not self.enabled or (version is not None and version != self.version):
+            return
+        self._remember(key, value)
+        if self.store is not None:
+            self.store.put(self.name, self.version, _disk_key(key), value, self.ttl)
+
+    def get_or_compute(self, key, fn):
+        version = self.version
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn()
+            self.put(key, value, version)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._data)
+        lookups = s["hits"] + s["disk_hits"] + s["misses"]
+        s["hit_rate"] = round((s["hits"] + s["disk_hits"]) / lookups, 4) if lookups else None
+        s["version"] = self.version
+        return s
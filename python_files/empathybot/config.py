@@ -0,0 +1,45 @@
+"""Paths, model names and label maps shared by the runtime and the offline prep CLI."""
+import os
+from pathlib import Path
+
+# Working folder (Colab default; override with EMPATHYBOT_HOME for local runs / replicas)
+WORKDIR = Path(os.environ.get("EMPATHYBOT_HOME", "/content/EmpathyBot"))
+DATA_DIR = WORKDIR / "data"
+
+CORPUS_RAW   = WORKDIR / "corpus.json"
+CORPUS_PATH  = WORKDIR / "corpus_clean.json"
+CORPUS_REVIEW = WORKDIR / "corpus_flagged.json"
+INDEX_PATH   = WORKDIR / "faiss.index"       # same layout as Data/faiss.index
+META_PATH    = WORKDIR / "faiss_meta.pkl"    # {"templates", "emotions", "fingerprint", "embedding_model"}
+INDEX_DIR    = WORKDIR / "index"            # per-emotion partitioned, memory-mapped embeddings (index.py)
+
+MODELS_DIR   = WORKDIR / "models"           # exported / quantized model artifacts
+
+# Artifacts shipped with the repo (sample data for benchmarks and golden checks)
+REPO_DATA_DIR = Path(__file__).resolve().parents[2] / "Data"
+
+DETECTOR_MODEL = "bhadresh-savani/distilbert-base-uncased-emotion"
+EMB_MODEL      = "sentence-transformers/all-MiniLM-L6-v2"
+GEN_MODEL      = "google/flan-t5-base"  # use "google/flan-t5-small" if VRAM is tight
+
+# Detector backend: "torch" (HF pipeline) or "onnx" (int8-quantized ONNX Runtime)
+DETECTOR_BACKEND = os.environ.get("EMPATHYBOT_DETECTOR_BACKEND", "torch")
+# Generator backend: "hf" (LangChain HuggingFacePipeline) or "int8" (QuantizedT5Engine, CPU)
+GEN_BACKEND = os.environ.get("EMPATHYBOT_GEN_BACKEND", "hf")
+# Speech-to-text: "whisper" (openai-whisper, torch) or "ct2" (faster-whisper, int8 CTranslate2 on CPU)
+STT_BACKEND = os.environ.get("EMPATHYBOT_STT_BACKEND", "whisper")
+WHISPER_SIZE = os.environ.get("WHISPER_SIZE", "base")
+# Template retrieval: "dense" (embeddings only) or opt-in "hybrid" (BM25 over template keywords + dense, rank-fused)
+RETRIEVAL_MODE = os.environ.get("EMPATHYBOT_RETRIEVAL", "dense")
+# Unix socket of a shared embedding worker (python -m empathybot.embeddings); unset = MiniLM in-process
+EMBED_SOCKET = os.environ.get("EMPATHYBOT_EMBED_SOCKET") or None
+
+VALID_EMOS = {"happiness", "sadness", "anger", "neutral"}
+
+# 6→4 bucket map (the detector and tweet_eval both use the 6-emotion label set)
+MAP6to4 = {
+    "joy": "happiness", "love": "happiness",
+    "sadness": "sadness",
+    "anger": "anger",
+    "fear": "neutral", "surprise": "neutral",
+}
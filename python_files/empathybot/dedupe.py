@@ -0,0 +1,154 @@
+"""
+Near-duplicate removal with MinHash + LSH banding (used by prep.clean_corpus).
+
+Semantics match the original greedy pass: records are taken in input order and a
+record is dropped when its word-set Jaccard similarity with an already *kept*
+record of the same bucket is >= threshold. Instead of comparing against every
+kept record, each kept record's MinHash signature is split into `bands` bands of
+`rows` rows and indexed; only records sharing a band are compared.
+
+    flt = NearDupFilter(threshold=0.85)
+    kept = [r for r in flt.filter(records, bucket=lambda r: r["emotion"], text=lambda r: r["template"])]
+    flt.report()   # per bucket: seen / kept / dropped / pairs compared / pairs pruned
+
+verify=True (default) confirms every LSH candidate with the exact Jaccard, so no
+false positives and output identical to the O(n²) pass up to LSH misses (which
+the banding below keeps below ~0.5% at the threshold). verify=False decides on
+the estimated similarity and keeps only signatures, not word sets, in memory.
+"""
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX32 = np.uint64(0xFFFFFFFF)
+
+def word_set(text: str) -> frozenset:
+    """Shingles used by text.jaccard(): whitespace-separated words."""
+    return frozenset(text.split())
+
+def exact_jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b: return 1.0
+    return len(a & b) / max(1, len(a | b))
+
+def _word_hash(w: str) -> int:
+    return int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=4).digest(), "little")
+
+def lsh_params(threshold: float, num_perm: int, max_miss: float = 0.005) -> tuple[int, int]:
+    """
+    (bands, rows) with bands*rows <= num_perm: the most rows per band (fewest
+    spurious candidates) whose miss probability at `threshold`,
+    (1 - t**rows) ** bands, stays <= max_miss.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1.0 - threshold ** rows) ** bands <= max_miss:
+            best = (bands, rows)
+    return best
+
+class MinHasher:
+    """Deterministic MinHash signatures over word sets (universal hashing mod 2^61-1)."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        gen = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = gen.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = gen.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, words: frozenset) -> np.ndarray:
+        if not words:
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        hv = np.fromiter((_word_hash(w) for w in words), dtype=np.uint64, count=len(words))
+        # (a*x + b) < 2^64 since a, x, b < 2^32
+        ph = ((hv[:, None] * self.a + self.b) % _PRIME) & _MAX32
+        return ph.min(axis=0).astype(np.uint32)
+
+class _Bucket:
+    __slots__ = ("tables", "words", "sigs", "empty_kept", "stats")
+
+    def __init__(self, bands: int):
+        self.tables = [defaultdict(list) for _ in range(bands)]   # band bytes -> kept ids
+        self.words = []       # kept id -> word set (verify=True)
+        self.sigs = []        # kept id -> signature (verify=False)
+        self.empty_kept = False
+        self.stats = {"seen": 0, "kept": 0, "dropped": 0, "pairs_compared": 0, "pairs_pruned": 0}
+
+class NearDupFilter:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int | None = None,
+                 verify: bool = True, seed: int = 1):
+        self.threshold = threshold
+        self.verify = verify
+        self.hasher = MinHasher(num_perm, seed)
+        if bands is None:
+            bands, rows = lsh_params(threshold, num_perm)
+        else:
+            rows = num_perm // bands
+        self.bands, self.rows = bands, rows
+        self._buckets: dict[str, _Bucket] = {}
+
+    def _bucket(self, name: str) -> _Bucket:
+        b = self._buckets.get(name)
+        if b is None:
+            b = self._buckets[name] = _Bucket(self.bands)
+        return b
+
+    def add(self, bucket: str, text: str) -> bool:
+        """True if `text` is kept (no near-duplicate kept before it in `bucket`), and index it."""
+        b = self._bucket(bucket)
+        b.stats["seen"] += 1
+        n_kept = b.stats["kept"]
+        words = word_set(text)
+
+        if not words:
+            # Jaccard(∅, ∅) = 1, Jaccard(∅, X) = 0: only another empty text is a duplicate
+            b.stats["pairs_pruned"] += n_kept
+            if b.empty_kept:
+                b.stats["dropped"] += 1
+                return False
+            b.empty_kept = True
+            b.stats["kept"] += 1
+            b.words.append(words); b.sigs.append(None)
+            return True
+
+        sig = self.hasher.signature(words)
+        keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = set()
+        for table, key in zip(b.tables, keys):
+            candidates.update(table.get(key, ()))
+
+        b.stats["pairs_compared"] += len(candidates)
+        b.stats["pairs_pruned"] += n_kept - len(candidates)
+        for j in sorted(candidates):
+            if self.verify:
+                sim = exact_jaccard(words, b.words[j])
+            else:
+                sim = float(np.mean(sig == b.sigs[j]))
+            if sim >= self.threshold:
+                b.stats["dropped"] += 1
+                return False
+
+        kid = n_kept
+        for table, key in zip(b.tables, keys):
+            table[key].append(kid)
+        if self.verify:
+            b.words.append(words); b.sigs.append(None)
+        else:
+            b.words.append(None); b.sigs.append(sig)
+        b.stats["kept"] += 1
+        return True
+
+    def filter(self, records, bucket, text):
+        """Lazily yield records that are not near-duplicates (input is consumed as a stream)."""
+        for r in records:
+            if self.add(bucket(r), text(r)):
+                yield r
+
+    def report(self) -> dict:
+        out = {name: dict(b.stats) for name, b in self._buckets.items()}
+        for s in out.values():
+            brute = s["pairs_compared"] + s["pairs_pruned"]
+            s["pruned_ratio"] = round(s["pairs_pruned"] / brute, 4) if brute else None
+        return {"threshold": self.threshold, "bands": self.bands, "rows": self.rows,
+                "verify": self.verify, "buckets": out}
@@ -0,0 +1,200 @@
+"""DistilBERT emotion detector (PyTorch or ONNX Runtime) + the 6→4 bucket mapping and keyword override."""
+import os, queue
+from contextlib import contextmanager
+from pathlib import Path
+
+from .config import DETECTOR_MODEL, DETECTOR_BACKEND, MODELS_DIR, MAP6to4
+from .text import clean_text
+
+MAX_LENGTH = 512   # tokens; DistilBERT's position limit, both backends truncate to it
+
+# Add a light, transparent heuristic: if strong sadness cues, prefer sadness.
+SAD_HINTS = {"down", "sad", "upset", "depressed", "lonely", "nothing works", "blue", "cry", "exhausted"}
+ANGER_HINTS = {"furious", "angry", "unfair", "mad", "irritated", "rage"}
+
+def heuristic_emotion_override(text: str, raw_label: str) -> str:
+    t = clean_text(text)
+    toks = set(t.split())
+    if any(h in t for h in SAD_HINTS) and raw_label in {"anger","fear","surprise"}:
+        return "sadness"
+    if any(h in toks for h in ANGER_HINTS) and raw_label in {"sadness","fear","surprise"}:
+        return "anger"
+    return raw_label
+
+def to_4_bucket_with_threshold(lbl: str, conf: float, thr: float = 0.45) -> str:
+    return "neutral" if conf < thr else MAP6to4.get(lbl.lower(), "neutral")
+
+def scores_by_label(out) -> dict[str, float]:
+    """Normalize a TextClassificationPipeline(top_k=None) result for ONE text."""
+    scores = out[0] if (out and isinstance(out[0], dict) is False) else out
+    # ensure we now have a list[dict]
+    if scores and isinstance(scores[0], dict):
+        return {d["label"].lower(): float(d["score"]) for d in scores}
+    raise RuntimeError(f"Unexpected detector output shape: {type(out)} => {out}")
+
+class _DetectorBase:
+    """detect()/detect_many() on top of a pipeline-shaped `self.pipe`."""
+    model_name: str
+    version: str
+
+    def scores(self, text: str) -> dict[str, float]:
+        return scores_by_label(self.pipe(clean_text(text)))
+
+    def detect(self, text: str) -> tuple[str, float]:
+        """Top 6-class label and its confidence."""
+        by = self.scores(text)
+        label = max(by, key=by.get)
+        return label, by[label]
+
+    def detect_many(self, texts: list[str], batch_size: int = 32) -> list[tuple[str, float]]:
+        """detect() over many texts with padded forward passes of `batch_size`."""
+        outs = self.pipe([clean_text(t) for t in texts], batch_size=batch_size)
+        res = []
+        for out in outs:
+            by = scores_by_label(out)
+            label = max(by, key=by.get)
+            res.append((label, by[label]))
+        return res
+
+class EmotionDetector(_DetectorBase):
+    """Eager PyTorch pipeline; use runtime.get_detector() for the shared instance."""
+
+    def __init__(self, model_name: str = DETECTOR_MODEL):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification, TextClassificationPipeline
+
+        self.model_name = model_name
+        self.version = model_name
+        self.tok = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.pipe = TextClassificationPipeline(
+            model=self.model,
+            tokenizer=self.tok,
+            top_k=None,   # all 6 label scores (return_all_scores=True is gone in newer transformers)
+            device=0 if torch.cuda.is_available() else -1,
+            truncation=True, max_length=MAX_LENGTH,   # as the ONNX backend; longer messages would fail
+        )
+
+# ---------- ONNX Runtime backend ----------
+def export_onnx(model_name: str = DETECTOR_MODEL, out_dir: Path = MODELS_DIR, quantize: bool = True) -> Path:
+    """
+    Export the classifier to ONNX (dynamic batch/seq axes) and optionally apply
+    dynamic int8 weight quantization. Files are reused once they exist.
+    """
+    d = out_dir / model_name.replace("/", "__")
+    fp32, int8 = d / "model.onnx", d / "model.int8.onnx"
+    target = int8 if quantize else fp32
+    if target.exists():
+        return target
+    d.mkdir(parents=True, exist_ok=True)
+
+    if not fp32.exists():
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        tok = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+        class _Logits(torch.nn.Module):
+            def __init__(self, m):
+                super().__init__(); self.m = m
+            def forward(self, input_ids, attention_mask):
+                return self.m(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        enc = tok(["a short example", "another one"], padding=True, return_tensors="pt")
+        tmp = d / "model.onnx.tmp"
+        export_kwargs = dict(
+            input_names=["input_ids", "attention_mask"], output_names=["logits"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "seq"},
+                          "attention_mask": {0: "batch", 1: "seq"},
+                          "logits": {0: "batch"}},
+            opset_version=14,
+        )
+        args = (enc["input_ids"], enc["attention_mask"])
+        try:   # torch >= 2.5 defaults to the dynamo exporter; keep the TorchScript one
+            torch.onnx.export(_Logits(model), args, str(tmp), dynamo=False, **export_kwargs)
+        except TypeError:
+            torch.onnx.export(_Logits(model), args, str(tmp), **export_kwargs)
+        os.replace(tmp, fp32)
+        print("Exported ONNX detector →", fp32)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        tmp = d / "model.int8.onnx.tmp"
+        quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, int8)
+        print("Quantized ONNX detector (int8) →", int8)
+    return target
+
+class SessionPool:
+    """Fixed pool of InferenceSessions so concurrent callers don't contend on one session."""
+
+    def __init__(self, path: Path, size: int = 2, intra_op_threads: int | None = None):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        self._free: queue.Queue = queue.Queue()
+        for _ in range(max(1, size)):
+            self._free.put(ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"]))
+
+    @contextmanager
+    def session(self):
+        sess = self._free.get()
+        try:
+            yield sess
+        finally:
+            self._free.put(sess)
+
+class OnnxEmotionDetector(_DetectorBase):
+    """Same interface as EmotionDetector, running the (int8) ONNX export on onnxruntime."""
+
+    def __init__(self, model_name: str = DETECTOR_MODEL, *, quantize: bool = True,
+                 pool_size: int = 2, intra_op_threads: int | None = None, export_dir: Path = MODELS_DIR):
+        import numpy as np
+        from transformers import AutoConfig, AutoTokenizer
+
+        self._np = np
+        self.model_name = model_name
+        self.version = f"{model_name}|onnx{'-int8' if quantize else ''}"
+        self.tok = AutoTokenizer.from_pretrained(model_name)
+        cfg = AutoConfig.from_pretrained(model_name)
+        self.labels = [cfg.id2label[i].lower() for i in range(cfg.num_labels)]
+        self.model_path = export_onnx(model_name, export_dir, quantize)
+        self._pool_args = (pool_size, intra_op_threads)
+        self.sessions = SessionPool(self.model_path, pool_size, intra_op_threads)
+
+    def after_fork(self):
+        # onnxruntime's thread pools don't survive fork; each worker opens its own sessions
+        self.sessions = SessionPool(self.model_path, *self._pool_args)
+
+    def _probs(self, texts: list[str]):
+        np = self._np
+        enc = self.tok(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+        feeds = {"input_ids": enc["input_ids"].astype(np.int64),
+                 "attention_mask": enc["attention_mask"].astype(np.int64)}
+        with self.sessions.session() as sess:
+            logits = sess.run(["logits"], feeds)[0]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        e = np.exp(logits)
+        return e / e.sum(axis=-1, keepdims=True)
+
+    def pipe(self, texts, batch_size: int = 32):
+        """Mimics TextClassificationPipeline(top_k=None) output."""
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = []
+        for i in range(0, len(texts), batch_size):
+            for row in self._probs(texts[i:i + batch_size]):
+                out.append([{"label": lbl, "score": float(p)} for lbl, p in zip(self.labels, row)])
+        return [out[0]] if single else out
+
+def load_detector(backend: str = DETECTOR_BACKEND, model_name: str = DETECTOR_MODEL):
+    if backend == "onnx":
+        return OnnxEmotionDetector(model_name)
+    if backend == "torch":
+        return EmotionDetector(model_name)
+    raise ValueError(f"Unknown detector backend: {backend!r} (expected 'torch' or 'onnx')")
@@ -0,0 +1,231 @@
+"""
+Query embeddings: a bounded LRU on normalized text, batched embed_many(), and an
+optional shared embedding worker on a Unix socket.
+
+    emb = load_embedder()                  # MiniLM in-process, or the worker at EMPATHYBOT_EMBED_SOCKET
+    vecs = emb.embed_many(["i feel awful", "so happy today"])    # float32 (n, dim)
+    emb.stats()                            # cache hits / misses / size
+
+    python -m empathybot.embeddings --socket /tmp/empathybot-embed.sock    # one MiniLM for N app processes
+
+QueryEmbedder is a LangChain `Embeddings`, so the LangChain vector store's
+embed_query() goes through the same cache as retrieval. Texts are keyed on
+lowercased, whitespace-collapsed text (MiniLM is uncased), and the normalized
+form is what gets embedded, so a cache hit returns exactly what a miss would.
+embed_documents() (index builds) bypasses the cache.
+
+Wire format (both directions): 4-byte big-endian length + payload. A request is
+JSON {"texts": [...]} ({"texts": []} is a handshake); the reply is a JSON header
+{"n", "dim", "model"} or {"error"}, followed by one frame of n*dim little-endian
+float32. The worker collects texts from all connections for up to `max_wait_ms`
+and embeds them in one batch.
+"""
+import argparse, json, os, queue, socket, socketserver, struct, threading
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .cache import LRUCache
+from .config import EMB_MODEL, EMBED_SOCKET
+
+def normalize_query(text: str) -> str:
+    return " ".join(str(text).split()).lower()
+
+class QueryEmbedder(Embeddings):
+    """LRU-cached front of a LangChain embedding model (local) or an EmbeddingClient (shared worker)."""
+
+    def __init__(self, base, model_name: str = EMB_MODEL, cache_size: int = 8192):
+        self.base = base
+        self.model_name = model_name
+        self.cache = LRUCache("embed", cache_size, version=model_name)
+
+    def embed_many(self, texts: list[str]) -> np.ndarray:
+        """float32 (len(texts), dim); cached texts are skipped, the rest go to the model in one batch."""
+        keys = [normalize_query(t) for t in texts]
+        out: list = [self.cache.get(k) for k in keys]
+        todo = list(dict.fromkeys(k for k, v in zip(keys, out) if v is None))
+        if todo:
+            fresh = dict(zip(todo, np.asarray(self.base.embed_documents(todo), dtype=np.float32)))
+            for k, v in fresh.items():
+                self.cache.put(k, v)
+            out = [fresh[k] if v is None else v for k, v in zip(keys, out)]
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(out)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_many([text])[0].tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vecs = self.base.embed_documents(list(texts))
+        return vecs.tolist() if isinstance(vecs, np.ndarray) else vecs
+
+    def after_fork(self):
+        if hasattr(self.base, "after_fork"):
+            self.base.after_fork()
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "remote": isinstance(self.base, EmbeddingClient), **self.cache.stats()}
+
+def _send(sock: socket.socket, payload: bytes):
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding worker closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+def _recv(sock: socket.socket) -> bytes:
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return _recv_exact(sock, n)
+
+class EmbeddingClient:
+    """Talks to an EmbeddingServer; one connection per calling thread, reconnected on failure."""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.model_name = self._call([])[0]["model"]
+
+    def _sock(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, texts: list[str]):
+        for attempt in (0, 1):   # one retry on a fresh connection (worker restarted)
+            try:
+                sock = self._sock()
+                _send(sock, json.dumps({"texts": texts}).encode("utf-8"))
+                head = json.loads(_recv(sock))
+                if "error" in head:
+                    raise RuntimeError(f"embedding worker: {head['error']}")
+                data = _recv(sock)
+                return head, np.frombuffer(data, dtype="<f4").reshape(head["n"], head["dim"])
+            except (ConnectionError, OSError):
+                sock = getattr(self._local, "sock", None)
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        return self._call(list(texts))[1]
+
+    def after_fork(self):
+        self._local = threading.local()   # never share the parent's connection
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """
+    One embedding model shared by every client process. Connection threads hand
+    their texts to a single model thread, which batches across clients.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, embedder: QueryEmbedder, max_batch: int = 64, max_wait_ms: float = 5.0):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.pending: queue.Queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        super().__init__(path, _Handler)
+        threading.Thread(target=self._model_loop, name="empathybot-embed", daemon=True).start()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        fut = Future()
+        self.pending.put((texts, fut))
+        return fut.result()
+
+    def _model_loop(self):
+        while True:
+            batch = [self.pending.get()]
+            size = len(batch[0][0])
+            try:
+                while size < self.max_batch:
+                    item = self.pending.get(timeout=self.max_wait)
+                    batch.append(item)
+                    size += len(item[0])
+            except queue.Empty:
+                pass
+            try:
+                vecs = self.embedder.embed_many([t for texts, _ in batch for t in texts])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            start = 0
+            for texts, fut in batch:
+                fut.set_result(vecs[start:start + len(texts)])
+                start += len(texts)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv: EmbeddingServer = self.server
+        while True:
+            try:
+                req = json.loads(_recv(self.request))
+            except (ConnectionError, OSError):
+                return
+            except ValueError:
+                _send(self.request, json.dumps({"error": "bad request"}).encode("utf-8"))
+                return
+            texts = [str(t) for t in req.get("texts") or []]
+            try:
+                vecs = srv.embed(texts) if texts else np.zeros((0, 0), dtype=np.float32)
+            except Exception as e:
+                _send(self.request, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8"))
+                continue
+            head = {"n": len(texts), "dim": int(vecs.shape[1]) if texts else 0, "model": srv.embedder.model_name}
+            _send(self.request, json.dumps(head).encode("utf-8"))
+            _send(self.request, np.ascontiguousarray(vecs, dtype="<f4").tobytes())
+
+def load_embedder(model_name: str = EMB_MODEL, socket_path: str | None = EMBED_SOCKET,
+                  cache_size: int = 8192) -> QueryEmbedder:
+    """The shared worker at `socket_path` if given (its model must match), else MiniLM in this process."""
+    if socket_path:
+        client = EmbeddingClient(socket_path)
+        if client.model_name != model_name:
+            raise RuntimeError(f"embedding worker at {socket_path} serves {client.model_name!r}, "
+                               f"expected {model_name!r}")
+        return QueryEmbedder(client, model_name, cache_size)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return QueryEmbedder(HuggingFaceEmbeddings(model_name=model_name), model_name, cache_size)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.embeddings")
+    ap.add_argument("--socket", default=EMBED_SOCKET or "/tmp/empathybot-embed.sock")
+    ap.add_argument("--model", default=EMB_MODEL)
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    ap.add_argument("--cache-size", type=int, default=8192)
+    args = ap.parse_args(argv)
+
+    server = EmbeddingServer(args.socket, load_embedder(args.model, None, args.cache_size),
+                             args.max_batch, args.max_wait_ms)
+    print(f"Embedding worker ({args.model}) on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""flan-t5 few-shot generator + reply post-processing and template composition."""
+import re
+
+from .config import GEN_MODEL, GEN_BACKEND
+from .safety import META, META_PATTERNS
+from .text import keyword_set
+
+examples = [
+    {"user":"i failed my exam and feel awful","emotion":"sadness",
+     "templates":"i’m really sorry you’re feeling this way. i’m here to listen—what happened?",
+     "reply":"I’m really sorry this feels so heavy. I’m here to listen—what happened?"},
+
+    {"user":"i got the job!!","emotion":"happiness",
+     "templates":"that’s fantastic—congrats! what are you most proud of?",
+     "reply":"That’s fantastic—congrats! What are you most proud of?"},
+
+    {"user":"they treated me so unfairly","emotion":"anger",
+     "templates":"your frustration makes sense. what triggered it most?",
+     "reply":"Your frustration makes sense. What triggered it most?"}
+]
+
+PREFIX = (
+    "You are an empathetic assistant.\n"
+    "Reply in 1–2 sentences. Acknowledge the feeling once, ask one gentle open question.\n"
+    "Paraphrase; do NOT quote the user’s words. Do NOT invent facts about the user.\n"
+    "Do NOT mention 'templates', 'emotion', or any guidelines. Output ONLY the reply text.\n\n"
+)
+SUFFIX = "User: {user}\nEmotion: {emotion}\nTemplates: {templates}\nReply:"
+
+def build_fewshot():
+    from langchain_core.prompts import PromptTemplate, FewShotPromptTemplate
+
+    example_prompt = PromptTemplate.from_template(
+        "User: {user}\nEmotion: {emotion}\nTemplates: {templates}\nReply: {reply}\n"
+    )
+    return FewShotPromptTemplate(
+        examples=examples,
+        example_prompt=example_prompt,
+        prefix=PREFIX,
+        suffix=SUFFIX,
+        input_variables=["user","emotion","templates"],
+    )
+
+DISCLAIMER='I’m not a therapist; for serious concerns or emergencies, please seek professional help immediately.'
+
+
+def too_similar(a: str, b: str) -> bool:
+    ak, bk = keyword_set(a), keyword_set(b)
+    if not ak or not bk: return False
+    overlap = len(ak & bk) / max(1, len(ak | bk))
+    return overlap > 0.7  # if >70% keyword overlap, it's basically a restatement
+
+def _strip_meta(text: str) -> str:
+    """Drop blank lines and lines that leak the prompt scaffolding; join the rest with spaces."""
+    lines = [ln for ln in text.strip().splitlines() if ln.strip()]
+    lines = [ln for ln in lines if not META.matches(ln)]
+    return " ".join(lines).strip()
+
+def _distinct_sentences(sents: list[str], limit: int = 2) -> list[str]:
+    """The first `limit` sentences that differ case-insensitively."""
+    uniq, seen = [], set()
+    for s in sents:
+        s2 = s.strip()
+        if not s2: continue
+        k = s2.lower()
+        if k in seen: continue
+        seen.add(k); uniq.append(s2)
+        if len(uniq) >= limit: break
+    return uniq
+
+def _destutter(text: str) -> str:
+    """Collapse repeated “I’m sorry”."""
+    return re.sub(r"(i(?:'m| am) sorry[, ]*){2,}", "I’m sorry, ", text, flags=re.I)
+
+def postprocess(text: str, user_text: str) -> str:
+    # strip meta lines
+    text = _strip_meta(text)
+
+    # split sentences, dedupe, cap 2
+    out = " ".join(_distinct_sentences(re.split(r'(?<=[.!?])\s+', text)))
+
+    # avoid heavy parroting of the user
+    if too_similar(out, user_text):
+        out = re.sub(r"\bi\b'm\b.*", "", out, flags=re.I).strip()
+
+    # de-stutter “I’m sorry”
+    out = _destutter(out)
+
+    return out.strip()
+
+OPENERS = {
+    "happiness": "That’s great to hear.",
+    "sadness": "I’m really sorry this feels so heavy.",
+    "anger": "I hear your frustration.",
+    "neutral": "Thanks for sharing."
+}
+FOLLOWUPS = {
+    "happiness": "What are you most proud of?",
+    "sadness": "Want to share what’s weighing on you?",
+    "anger": "What felt most unfair about it?",
+    "neutral": "Want to tell me more so I can understand better?"
+}
+
+def compose_from_templates(bucket: str, templates: list[str]) -> str:
+    opener = OPENERS.get(bucket, OPENERS["neutral"])
+    ask = FOLLOWUPS.get(bucket, FOLLOWUPS["neutral"])
+    main = templates[0].strip().rstrip(".")
+    # small paraphrase-ish join
+    return f"{opener} {main.capitalize()}. {ask}"
+
+def is_weak_reply(final: str, user_text: str) -> bool:
+    """Post-processed output too short, echoing the prompt, or parroting the user."""
+    return (len(final.split()) < 4
+            or "you are an empathetic assistant" in final.lower()
+            or too_similar(final, user_text))
+
+# Sentence boundary used by postprocess(): terminal punctuation followed by whitespace
+SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+class IncrementalPostprocessor:
+    """
+    Streaming counterpart of postprocess(): feed() raw generated chunks, get back
+    text that is safe to show; the deltas concatenate to postprocess(raw).
+
+    Any later word can turn a line into a meta line, so nothing of a line is
+    released before the line ends (newline) or generation stops. From ended
+    lines, complete sentences are released once they pass the same dedupe as
+    postprocess(). `done` turns True once `max_sents` distinct sentences are
+    complete so generation can stop; the rest is released right then. Only
+    parroting of the user (and the weak-reply fallback) can still make the
+    final reply differ from the stream (see streaming.py).
+    """
+
+    def __init__(self, user_text: str = "", max_sents: int = 2):
+        self.user_text = user_text
+        self.max_sents = max_sents
+        self.raw = ""            # everything the model produced
+        self.emitted = ""        # text released so far
+        self.done = False
+
+    def _complete(self, text: str, closed: bool) -> list[str]:
+        """Distinct sentences of `text` that no later text can change."""
+        kept = _strip_meta(text)
+        sents = SENT_SPLIT_RE.split(kept)
+        if not (kept.endswith((".", "!", "?")) and (closed or text[-1:].isspace())):
+            sents = sents[:-1]   # may still grow
+        return _distinct_sentences(sents, self.max_sents)
+
+    def _release(self, target: str) -> str:
+        if not target.startswith(self.emitted):
+            return ""            # parroting removed shown text; the final reply replaces it
+        delta = target[len(self.emitted):]
+        self.emitted = target
+        return delta
+
+    def feed(self, chunk: str) -> str:
+        if self.done or not chunk:
+            return ""
+        self.raw += chunk
+        if len(self._complete(self.raw, closed=False)) >= self.max_sents:
+            return self.finish()
+        lines = self.raw.splitlines(keepends=True)
+        if lines and lines[-1].splitlines()[0] == lines[-1]:   # last line still open
+            lines.pop()
+        return self._release(_destutter(" ".join(self._complete("".join(lines), closed=True))))
+
+    def finish(self) -> str:
+        """Release the rest once generation ends (or is about to be stopped)."""
+        if self.done:
+            return ""
+        self.done = True
+        return self._release(postprocess(self.raw, self.user_text))
+
+# Decoding settings for the (non-streaming) generation pipeline
+GEN_KWARGS = dict(
+    max_new_tokens=80,
+    temperature=0.7,
+    top_p=0.9,
+    num_beams=4,
+    no_repeat_ngram_size=3,
+    repetition_penalty=1.2,
+    early_stopping=True,
+)
+# Per-request decoding modes; "beam" is what GEN_KWARGS does (temperature/top_p are unused without sampling)
+DECODING = {
+    "beam": dict(max_new_tokens=80, num_beams=4, no_repeat_ngram_size=3, repetition_penalty=1.2, early_stopping=True),
+    "greedy": dict(max_new_tokens=80, num_beams=1, do_sample=False, no_repeat_ngram_size=3, repetition_penalty=1.2),
+}
+
+def static_prefix(fewshot) -> str:
+    """The request-independent head of every few-shot prompt (instructions + examples)."""
+    fields = dict(user="\x00", emotion="\x00", templates="\x00")
+    full, tail = fewshot.format(**fields), SUFFIX.format(**fields)
+    assert full.endswith(tail), "few-shot prompt no longer ends with SUFFIX"
+    return full[:-len(tail)]
+
+class _GeneratorBase:
+    """Prompt building + streaming shared by the generation backends (needs self.tok/model/fewshot)."""
+
+    def build_prompt(self, user_message: str, bucket: str, templates: list[str], context: str | None = None) -> str:
+        fields = dict(user=user_message, emotion=bucket, templates=" | ".join(templates))
+        prompt = self.fewshot.format(**fields)
+        if not context:
+            return prompt
+        # session context goes right before the request part, so static_prefix() still matches
+        tail = SUFFIX.format(**fields)
+        return f"{prompt[:-len(tail)]}Context: {context}\n{tail}"
+
+    def stream(self, prompt: str, stop_event=None, max_new_tokens: int = 80):
+        """
+        Yield decoded text chunks as flan-t5 produces them.
+
+        HF streamers don't support beam search, so this path decodes greedily with the
+        same anti-repetition settings. Setting `stop_event` (threading.Event) ends
+        generation at the next step; closing the iterator does the same.
+        """
+        import threading
+        from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+
+        stop_event = stop_event or threading.Event()
+
+        class _StopOnEvent(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop_event.is_set()
+
+        inputs = self.tok(prompt, return_tensors="pt").to(self.model.device)
+        streamer = TextIteratorStreamer(self.tok, skip_special_tokens=True)
+        kwargs = dict(
+            **inputs,
+            streamer=streamer,
+            **{**DECODING["greedy"], "max_new_tokens": max_new_tokens},
+            stopping_criteria=StoppingCriteriaList([_StopOnEvent()]),
+        )
+        worker = threading.Thread(target=self.model.generate, kwargs=kwargs, daemon=True)
+        worker.start()
+        try:
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+        finally:
+            stop_event.set()
+            worker.join()
+
+class ReplyGenerator(_GeneratorBase):
+    """flan-t5 behind a LangChain HuggingFacePipeline; use runtime.get_generator() for the shared instance."""
+
+    def __init__(self, model_name: str = GEN_MODEL):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline as hf_pipeline
+        from langchain_community.llms.huggingface_pipeline import HuggingFacePipeline
+
+        self.model_name = model_name
+        self.version = f"{model_name}|{sorted(GEN_KWARGS.items())}"   # cache namespace
+        # 1) Load with GPU/half-precision if available (saves VRAM, faster)
+        self.tok = AutoTokenizer.from_pretrained(model_name)
+        model_kwargs = {}
+        if torch.cuda.is_available():
+            model_kwargs = {"torch_dtype": torch.float16, "device_map": "auto"}
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name, **model_kwargs)
+
+        # 2) Build generation pipeline with anti-repetition + sane max tokens
+        self.pipe = hf_pipeline(
+            task="text2text-generation",
+            model=self.model,
+            tokenizer=self.tok,
+            **GEN_KWARGS,
+        )
+
+        # 3) Wrap in LangChain LLM
+        self.llm = HuggingFacePipeline(pipeline=self.pipe)
+        self.fewshot = build_fewshot()
+
+    def generate(self, prompt: str, decoding: str | None = None) -> str:
+        if decoding in (None, "beam"):
+            return self.llm.invoke(prompt).strip()
+        return self.generate_many([prompt], decoding=decoding)[0]
+
+    def generate_many(self, prompts: list[str], batch_size: int = 8, decoding: str | None = None) -> list[str]:
+        """generate() over many prompts in padded batches (same decoding settings)."""
+        overrides = DECODING[decoding] if decoding else {}
+        outs = self.pipe(list(prompts), batch_size=batch_size, **overrides)
+        res = []
+        for out in outs:
+            if isinstance(out, list):   # older pipelines: one list per input
+                out = out[0]
+            res.append(out["generated_text"].strip())
+        return res
+
+class QuantizedT5Engine(_GeneratorBase):
+    """
+    CPU-oriented flan-t5 engine: int8 dynamic quantization of the Linear layers,
+    beam or greedy decoding per call, and (optionally) the few-shot prefix encoded
+    once and reused.
+
+    T5's encoder attends bidirectionally, so reusing the prefix means encoding
+    prefix and request suffix separately and concatenating the hidden states
+    (Fusion-in-Decoder style). The decoder still sees the whole prompt, but the
+    result is not bit-identical to full encoding; bench.generator measures it.
+    """
+
+    def __init__(self, model_name: str = GEN_MODEL, *, quantize: bool = True, prefix_cache: bool = True,
+                 decoding: str = "beam", num_threads: int | None = None):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        self.model_name = model_name
+        self.quantize, self.prefix_cache, self.decoding = quantize, prefix_cache, decoding
+        self.version = f"{model_name}|int8={quantize}|prefix_cache={prefix_cache}"   # cache namespace
+        self.tok = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.fewshot = build_fewshot()
+        self.prefix = static_prefix(self.fewshot)
+        self._prefix_states = None   # (hidden [1, Lp, d], mask [1, Lp]) once computed
+
+    def _prefix_encoding(self):
+        if self._prefix_states is None:
+            torch = self._torch
+            enc = self.tok(self.prefix, add_special_tokens=False, return_tensors="pt")
+            with torch.inference_mode():
+                hidden = self.model.get_encoder()(**enc).last_hidden_state
+            self._prefix_states = (hidden, enc["attention_mask"])
+        return self._prefix_states
+
+    def _encode(self, prompts: list[str]):
+        """Encoder hidden states + attention mask for a batch of full prompts."""
+        torch = self._torch
+        encoder = self.model.get_encoder()
+        if self.prefix_cache and all(p.startswith(self.prefix) for p in prompts):
+            p_hidden, p_mask = self._prefix_encoding()
+            enc = self.tok([p[len(self.prefix):] for p in prompts], padding=True, return_tensors="pt")
+            with torch.inference_mode():
+                s_hidden = encoder(**enc).last_hidden_state
+            n = len(prompts)
+            hidden = torch.cat([p_hidden.expand(n, -1, -1), s_hidden], dim=1)
+            mask = torch.cat([p_mask.expand(n, -1), enc["attention_mask"]], dim=1)
+            return hidden, mask
+        enc = self.tok(prompts, padding=True, return_tensors="pt")
+        with torch.inference_mode():
+            return encoder(**enc).last_hidden_state, enc["attention_mask"]
+
+    def generate_many(self, prompts: list[str], batch_size: int = 8, decoding: str | None = None) -> list[str]:
+        from transformers.modeling_outputs import BaseModelOutput
+
+        torch = self._torch
+        kwargs = DECODING[decoding or self.decoding]
+        res = []
+        for i in range(0, len(prompts), batch_size):
+            hidden, mask = self._encode(list(prompts[i:i + batch_size]))
+            with torch.inference_mode():
+                out = self.model.generate(encoder_outputs=BaseModelOutput(last_hidden_state=hidden),
+                                          attention_mask=mask, **kwargs)
+            res.extend(t.strip() for t in self.tok.batch_decode(out, skip_special_tokens=True))
+        return res
+
+    def generate(self, prompt: str, decoding: str | None = None) -> str:
+        return self.generate_many([prompt], decoding=decoding)[0]
+
+def load_generator(backend: str = GEN_BACKEND, model_name: str = GEN_MODEL):
+    if backend == "hf":
+        return ReplyGenerator(model_name)
+    if backend == "int8":
+        return QuantizedT5Engine(model_name)
+    raise ValueError(f"Unknown generator backend: {backend!r} (expected 'hf' or 'int8')")
@@ -0,0 +1,166 @@
+"""
+Pre-fork model hosting: load the models once, fork workers that share the weights.
+
+    python -m empathybot.serve --workers 4          # serve.py uses prefork() for --workers > 1
+    python -m empathybot.hosting --pid <master pid> # per-worker RSS vs shared memory, for capacity planning
+
+The master loads the detector, retriever and generator (runtime.init), freezes
+the garbage collector's view of everything allocated so far, then forks. Model
+weights are large tensor buffers nobody writes to, so their pages stay shared
+copy-on-write between all workers; each worker only pays for what it touches
+afterwards (activations, caches, Python object headers). The template
+embeddings are an np.memmap and are shared through the page cache anyway.
+
+Not shared: ONNX Runtime sessions (their thread pools do not survive fork, so
+the onnx detector re-creates them per worker) and Whisper (loaded by the
+Streamlit app, not the server). Per-worker state created after fork (batcher,
+SQLite connections, stage caches) is private.
+
+Memory figures come from /proc/<pid>/smaps_rollup: RSS counts shared pages in
+every process, PSS splits them between the processes sharing them, so the sum
+of PSS is what the box actually spends.
+"""
+import argparse, gc, json, os, signal, sys, time
+
+MB = 2**20
+
+def process_memory(pid: int | str = "self") -> dict:
+    """rss / pss / shared / private MiB of one process (Linux; {} elsewhere)."""
+    fields = {}
+    for name in ("smaps_rollup", "smaps"):
+        try:
+            with open(f"/proc/{pid}/{name}") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and parts[2] == "kB":
+                        key = parts[0].rstrip(":")
+                        fields[key] = fields.get(key, 0) + int(parts[1]) * 1024
+            break
+        except OSError:
+            continue
+    if not fields:
+        return {}
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": round(fields.get("Rss", 0) / MB, 1), "pss_mb": round(fields.get("Pss", 0) / MB, 1),
+            "shared_mb": round(shared / MB, 1), "private_mb": round(private / MB, 1)}
+
+def children(pid: int) -> list[int]:
+    out = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    return out
+
+def memory_report(pids: list[int], master: int | None = None) -> dict:
+    """Per-process memory plus totals and the marginal cost of one more worker."""
+    workers = [{"pid": p, **process_memory(p)} for p in pids]
+    workers = [w for w in workers if "rss_mb" in w]
+    out = {"workers": workers}
+    if master is not None:
+        out["master"] = {"pid": master, **process_memory(master)}
+    procs = workers + ([out["master"]] if master is not None and "rss_mb" in out["master"] else [])
+    if workers:
+        out["total_rss_mb"] = round(sum(p["rss_mb"] for p in procs), 1)     # what naive per-process sums suggest
+        out["total_pss_mb"] = round(sum(p["pss_mb"] for p in procs), 1)     # what the box actually spends
+        out["per_worker_private_mb"] = round(sum(w["private_mb"] for w in workers) / len(workers), 1)
+        out["per_worker_shared_mb"] = round(sum(w["shared_mb"] for w in workers) / len(workers), 1)
+    return out
+
+def _limit_threads(n: int | None):
+    """Intra-op threads for torch in this process (None: leave as is)."""
+    if not n or "torch" not in sys.modules:
+        return
+    sys.modules["torch"].set_num_threads(n)
+
+def prefork(workers: int, run, *, preload=None, threads_per_worker: int | None = None, report_after: float = 10.0):
+    """
+    Call `preload()` once, fork `workers` processes that each call `run()`, and
+    supervise them: a worker that dies is re-forked from the loaded master,
+    SIGINT/SIGTERM stop everything. Prints memory_report() `report_after`
+    seconds after start (0 disables).
+    """
+    from . import runtime
+
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")   # tokenizers' thread pool is not fork-safe
+    try:
+        import torch
+        torch.set_num_threads(1)   # keep the master's OpenMP pool unused so children can start their own
+    except ImportError:
+        pass
+    t0 = time.perf_counter()
+    (preload or runtime.init)()
+    print(f"Master {os.getpid()} loaded models in {time.perf_counter() - t0:.1f}s "
+          f"({process_memory().get('rss_mb', '?')} MiB RSS)")
+    gc.collect()
+    gc.freeze()   # later collections skip (and so don't write to) the objects shared with the workers
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    pids: dict[int, tuple[int, float]] = {}   # pid -> (slot, start time)
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                _limit_threads(threads)
+                runtime.after_fork()
+                run()
+            except KeyboardInterrupt:
+                pass
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        pids[pid] = (slot, time.monotonic())
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(workers):
+        spawn(slot)
+
+    started = time.monotonic()
+    reported = not report_after
+    while pids:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            slot, born = pids.pop(pid)
+            if not stopping:
+                print(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}); restarting", file=sys.stderr)
+                if time.monotonic() - born < 1.0:
+                    time.sleep(1.0)   # don't spin on a worker that fails at startup
+                spawn(slot)
+            continue
+        if not reported and time.monotonic() - started >= report_after:
+            print(json.dumps(memory_report(list(pids), os.getpid()), indent=2))
+            reported = True
+        time.sleep(0.2)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.hosting",
+                                 description="Per-worker RSS vs shared memory of a pre-forked server")
+    ap.add_argument("--pid", type=int, required=True, help="master pid (its children are the workers)")
+    args = ap.parse_args(argv)
+    print(json.dumps(memory_report(children(args.pid), args.pid), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Per-emotion partitioned template embedding index.
+
+Template embeddings live in L2-normalized, C-contiguous float32 matrices saved
+as .npy and memory-mapped on load. Within a matrix (a segment, PartitionedIndex)
+rows are grouped by emotion, so each VALID_EMOS bucket is a contiguous slice
+(its partition). A filtered search is an exact inner-product top-k inside one
+slice per segment — no over-fetch-then-filter.
+
+SegmentedIndex is what the retriever holds: the segments back to back (global
+row ids never move), plus tombstoned rows that searches skip. Corpus updates
+(ingest.py) append a segment with only the new templates and tombstone removed
+ones; compacted() folds everything back into one segment.
+
+On disk (directory, e.g. $EMPATHYBOT_HOME/index/):
+    segment-<generation>-<hash>.npy     one matrix per segment
+    meta.json                           fingerprint, model, generation, per-segment file/templates/emotions,
+                                        tombstones
+Segment files are written first and never modified; meta.json is replaced
+last, so readers never see a half-written index and a reader still holding an
+older generation keeps working (an unlinked, memory-mapped file stays valid).
+Older single-matrix layouts (embeddings-*.npy + meta.json) load as one segment.
+"""
+import hashlib, json, os, tempfile
+from pathlib import Path
+
+import numpy as np
+
+def l2_normalize(x: np.ndarray) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+def topk_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores per row, best first (ties → lower index first)."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (scores.shape[0], 1))
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.lexsort((idx, -part), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+class PartitionedIndex:
+    def __init__(self, vectors: np.ndarray, templates: list[str], emotions: list[str],
+                 fingerprint: str, model_name: str, path: Path | None = None):
+        self.vectors = vectors          # [N, d] float32, possibly np.memmap
+        self.templates = templates      # row-aligned
+        self.emotions = emotions
+        self.fingerprint = fingerprint
+        self.model_name = model_name
+        self.path = path
+        self.partitions: dict[str, tuple[int, int]] = {}
+        start = 0
+        for i in range(1, len(emotions) + 1):
+            if i == len(emotions) or emotions[i] != emotions[start]:
+                if emotions[start] in self.partitions:
+                    raise ValueError("rows must be grouped by emotion")
+                self.partitions[emotions[start]] = (start, i)
+                start = i
+
+    def __len__(self):
+        return len(self.templates)
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    @classmethod
+    def build(cls, templates: list[str], emotions: list[str], vectors, fingerprint: str, model_name: str):
+        """Group rows by emotion (stable within a bucket) and normalize."""
+        order = sorted(range(len(templates)), key=lambda i: (emotions[i], i))
+        vecs = l2_normalize(np.asarray(vectors, dtype=np.float32)[order])
+        return cls(vecs, [templates[i] for i in order], [emotions[i] for i in order], fingerprint, model_name)
+
+    def search_many(self, queries: np.ndarray, k: int, emotion: str | None = None) -> list[list[int]]:
+        """
+        Exact top-k rows per (normalized) query. emotion=None searches the global
+        index; an unknown emotion returns empty lists.
+        """
+        if emotion is None:
+            start, end = 0, len(self)
+        elif emotion in self.partitions:
+            start, end = self.partitions[emotion]
+        else:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ self.vectors[start:end].T
+        return (topk_rows(scores, k) + start).tolist()
+
+    def search(self, query: np.ndarray, k: int, emotion: str | None = None) -> list[int]:
+        return self.search_many(query.reshape(1, -1), k, emotion)[0]
+
+def _atomic_write(directory: Path, name: str, prefix: str, suffix: str, write):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        write(f)
+    os.replace(tmp, directory / name)
+
+class SegmentedIndex:
+    """
+    Append-only sequence of PartitionedIndex segments with tombstones. Global
+    row r is row r - offset of its segment; rows are never renumbered except by
+    compacted(). Updates return a new index (ingest.py sets its fingerprint
+    before saving); a published index is never mutated.
+    """
+
+    def __init__(self, segments: list[PartitionedIndex], fingerprint: str, model_name: str,
+                 tombstones=(), generation: int = 0, path: Path | None = None):
+        self.segments = segments
+        self.fingerprint = fingerprint
+        self.model_name = model_name
+        self.tombstones = frozenset(tombstones)
+        self.generation = generation
+        self.path = path
+        self.offsets = []
+        n = 0
+        for seg in segments:
+            self.offsets.append(n)
+            n += len(seg)
+        self.templates = [t for seg in segments for t in seg.templates]
+        self.emotions = [e for seg in segments for e in seg.emotions]
+        # per segment: local rows to skip (None when the segment has no tombstones)
+        self._dead = []
+        for seg, off in zip(segments, self.offsets):
+            dead = sorted(r - off for r in self.tombstones if off <= r < off + len(seg))
+            self._dead.append(np.asarray(dead, dtype=np.int64) if dead else None)
+
+    def __len__(self):
+        return len(self.templates)
+
+    @property
+    def n_alive(self) -> int:
+        return len(self) - len(self.tombstones)
+
+    @property
+    def dim(self) -> int:
+        return self.segments[0].dim if self.segments else 0
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All rows as one matrix (tombstoned rows included; for the LangChain store, not for search)."""
+        if len(self.segments) == 1:
+            return self.segments[0].vectors
+        return np.concatenate([np.asarray(seg.vectors) for seg in self.segments]) if self.segments \
+            else np.zeros((0, 0), dtype=np.float32)
+
+    def alive_rows(self) -> list[int]:
+        return [r for r in range(len(self)) if r not in self.tombstones]
+
+    def partition_rows(self) -> dict[str, np.ndarray]:
+        """emotion -> global ids of its live rows, in row order."""
+        rows: dict[str, list[int]] = {}
+        for seg, off in zip(self.segments, self.offsets):
+            for emo, (start, end) in seg.partitions.items():
+                rows.setdefault(emo, []).extend(r for r in range(off + start, off + end) if r not in self.tombstones)
+        return {emo: np.asarray(r, dtype=np.int64) for emo, r in rows.items()}
+
+    @classmethod
+    def build(cls, templates: list[str], emotions: list[str], vectors, fingerprint: str, model_name: str):
+        seg = PartitionedIndex.build(templates, emotions, vectors, fingerprint, model_name)
+        return cls([seg], fingerprint, model_name)
+
+    def with_changes(self, templates: list[str], emotions: list[str], vectors, removed: set[int]) -> "SegmentedIndex":
+        """Append one segment with the new rows and tombstone `removed` (global ids); the next generation."""
+        segments = list(self.segments)
+        if templates:
+            segments.append(PartitionedIndex.build(templates, emotions, vectors, self.fingerprint, self.model_name))
+        return SegmentedIndex(segments, self.fingerprint, self.model_name, self.tombstones | set(removed),
+                              self.generation + 1)
+
+    def compacted(self) -> "SegmentedIndex":
+        """All live rows in one segment (row ids change; vectors are copied, not re-embedded)."""
+        alive = self.alive_rows()
+        vecs = self.vectors[alive] if alive else np.zeros((0, self.dim), dtype=np.float32)
+        seg = PartitionedIndex.build([self.templates[r] for r in alive], [self.emotions[r] for r in alive],
+                                     vecs, self.fingerprint, self.model_name)
+        return SegmentedIndex([seg], self.fingerprint, self.model_name, (), self.generation + 1)
+
+    def save(self, directory: Path) -> Path:
+        """Write segments not on disk yet, then meta.json; drop matrix files no longer referenced."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for seg in self.segments:
+            if seg.path is None or seg.path.parent.resolve() != directory.resolve():
+                vecs = np.ascontiguousarray(seg.vectors, dtype=np.float32)
+                digest = hashlib.sha1(vecs.tobytes()).hexdigest()[:12]
+                name = f"segment-{self.generation}-{digest}.npy"
+                _atomic_write(directory, name, ".seg.", ".npy.tmp", lambda f: np.save(f, vecs))
+                seg.path = directory / name
+            entries.append({"vectors": seg.path.name, "templates": seg.templates, "emotions": seg.emotions})
+
+        meta = {"fingerprint": self.fingerprint, "embedding_model": self.model_name, "dim": self.dim,
+                "generation": self.generation, "segments": entries, "tombstones": sorted(self.tombstones)}
+        _atomic_write(directory, "meta.json", ".meta.", ".json.tmp",
+                      lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+        self.path = directory / "meta.json"
+
+        keep = {e["vectors"] for e in entries}
+        for old in list(directory.glob("segment-*.npy")) + list(directory.glob("embeddings-*.npy")):
+            if old.name not in keep:
+                try: old.unlink()
+                except OSError: pass
+        return self.path
+
+    @staticmethod
+    def stamp(directory: Path):
+        """(mtime_ns, size) of meta.json — cheap change check for hot reload; None if missing."""
+        try:
+            st = (Path(directory) / "meta.json").stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True):
+        """Open a saved index (memory-mapped by default); None if missing or unreadable."""
+        directory = Path(directory)
+        try:
+            meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+            entries = meta.get("segments")
+            if entries is None:   # single-matrix layout
+                entries = [{"vectors": meta["vectors"], "templates": meta["templates"], "emotions": meta["emotions"]}]
+            segments = []
+            for e in entries:
+                vecs = np.load(directory / e["vectors"], mmap_mode="r" if mmap else None)
+                if vecs.shape != (len(e["templates"]), meta["dim"]) or vecs.dtype != np.float32:
+                    return None
+                segments.append(PartitionedIndex(vecs, e["templates"], e["emotions"], meta["fingerprint"],
+                                                 meta["embedding_model"], path=directory / e["vectors"]))
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(segments, meta["fingerprint"], meta["embedding_model"], meta.get("tombstones", ()),
+                   meta.get("generation", 0), path=directory / "meta.json")
+
+    def search_many(self, queries: np.ndarray, k: int, emotion: str | None = None) -> list[list[int]]:
+        """
+        Exact top-k live rows per (normalized) query across all segments.
+        emotion=None searches everything; an unknown emotion returns empty lists.
+        """
+        if len(self.segments) == 1 and self._dead[0] is None:   # the common case: no updates since the build
+            return self.segments[0].search_many(queries, k, emotion)
+        scores, ids = [], []
+        for seg, off, dead in zip(self.segments, self.offsets, self._dead):
+            if emotion is None:
+                start, end = 0, len(seg)
+            elif emotion in seg.partitions:
+                start, end = seg.partitions[emotion]
+            else:
+                continue
+            sc = queries @ seg.vectors[start:end].T
+            if dead is not None:
+                local = dead[(dead >= start) & (dead < end)] - start
+                sc[:, local] = -np.inf
+            scores.append(sc)
+            ids.append(np.arange(off + start, off + end))
+        if not scores:
+            return [[] for _ in range(len(queries))]
+        scores = np.concatenate(scores, axis=1)
+        ids = np.concatenate(ids)
+        top = topk_rows(scores, k)
+        live = np.isfinite(np.take_along_axis(scores, top, axis=1))
+        return [ids[t[m]].tolist() for t, m in zip(top, live)]
+
+    def search(self, query: np.ndarray, k: int, emotion: str | None = None) -> list[int]:
+        return self.search_many(query.reshape(1, -1), k, emotion)[0]
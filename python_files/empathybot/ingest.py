@@ -0,0 +1,235 @@
+"""
+Incremental template corpus updates: only the delta is cleaned, flagged, deduped and embedded.
+
+    python -m empathybot.ingest add new_templates.jsonl     # [{"emotion", "template"}, ...] or JSON Lines
+    python -m empathybot.ingest remove old_templates.json   # tombstone these (matched after cleaning)
+    python -m empathybot.ingest sync corpus.json            # diff a full raw corpus against the last sync
+    python -m empathybot.ingest compact                     # fold segments + tombstones into one segment
+
+New templates go through the same validation and safety flagging as
+`prep corpus`, are deduped exactly and near-duplicates (MinHash, same bucket)
+against the live corpus, embedded, and appended to the index as one new
+segment; removed templates are tombstoned. Each update is a new index
+generation written next to the old one (index.SegmentedIndex.save), and
+corpus_clean.json is rewritten in index order so a restart loads the same
+index without rebuilding. Running servers pick up the generation through
+TemplateRetriever.reload() (serve.py polls for it; POST /admin/reload forces it).
+
+`sync` keeps a manifest of raw record hashes → cleaned (emotion, template) in
+the index directory, so re-syncing an edited corpus only touches the records
+that were added, changed or deleted since the last sync.
+"""
+import argparse, fcntl, hashlib, json, os, tempfile, time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from .config import CORPUS_PATH, CORPUS_REVIEW, EMB_MODEL, INDEX_DIR
+from .dedupe import NearDupFilter
+from .prep import ENABLE_NEAR_DUP, NEAR_DUP_JACCARD, NEAR_DUP_VERIFY, iter_records, validate_records
+from .text import clean_text
+
+MAX_SEGMENTS = 8       # compact once an update would leave more segments than this
+MAX_DEAD_FRACTION = 0.25   # ... or more than this share of rows tombstoned
+
+def raw_key(record: dict) -> str:
+    h = hashlib.sha1(str(record.get("emotion", "")).encode("utf-8"))
+    h.update(b"\x00" + str(record.get("template", "")).encode("utf-8"))
+    return h.hexdigest()
+
+def _write_json(path: Path, payload, indent: int | None = 2):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp, path)
+
+class CorpusIngestor:
+    def __init__(self, index_dir: Path = INDEX_DIR, corpus_path: Path = CORPUS_PATH,
+                 review_path: Path = CORPUS_REVIEW, model_name: str = EMB_MODEL, emb=None,
+                 max_segments: int = MAX_SEGMENTS, max_dead: float = MAX_DEAD_FRACTION):
+        self.index_dir = Path(index_dir)
+        self.corpus_path = Path(corpus_path)
+        self.review_path = Path(review_path)
+        self.model_name = model_name
+        self._emb = emb
+        self.max_segments = max_segments
+        self.max_dead = max_dead
+
+    @property
+    def emb(self):
+        if self._emb is None:
+            from .embeddings import load_embedder
+            self._emb = load_embedder(self.model_name)   # the shared worker if EMPATHYBOT_EMBED_SOCKET is set
+        return self._emb
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.index_dir / "ingest_manifest.json"
+
+    @contextmanager
+    def _locked(self):
+        """One writer per index directory (readers never need the lock)."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_dir / ".ingest.lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _current(self):
+        """The live index, built from corpus_clean.json the first time."""
+        from .index import SegmentedIndex
+        from .retriever import load_corpus, load_or_build_index
+
+        index = SegmentedIndex.load(self.index_dir)
+        if index is None or index.model_name != self.model_name:
+            index = load_or_build_index(load_corpus(self.corpus_path), self.emb, self.model_name, self.index_dir)
+        return index
+
+    def _apply(self, validated: list, remove_pairs: list[tuple[str, str]]) -> dict:
+        """validated: validate_records() output for the additions; remove_pairs: cleaned (emotion, template)."""
+        from .retriever import corpus_fingerprint
+
+        t0 = time.perf_counter()
+        counts = Counter(input=len(validated))
+        index = self._current()
+        live = {(index.emotions[r], index.templates[r]): r for r in index.alive_rows()}
+
+        removed = set()
+        for pair in remove_pairs:
+            row = live.pop(pair, None)
+            if row is None:
+                counts["not_found"] += 1
+            else:
+                removed.add(row)
+
+        candidates, flagged = [], []
+        for res in validated:
+            if res is None:
+                counts["invalid"] += 1
+            elif not res[0]:
+                flagged.append(res[1])
+            elif (res[1]["emotion"], res[1]["template"]) in live:
+                counts["duplicates"] += 1
+            else:
+                live[(res[1]["emotion"], res[1]["template"])] = -1   # also dedupes within the batch
+                candidates.append(res[1])
+        counts["flagged"] = len(flagged)
+
+        if ENABLE_NEAR_DUP and candidates:
+            # seed with the live templates of the touched buckets (hashing only, no embedding)
+            near = NearDupFilter(threshold=NEAR_DUP_JACCARD, verify=NEAR_DUP_VERIFY)
+            touched = {c["emotion"] for c in candidates}
+            for (emo, text), row in live.items():
+                if row >= 0 and emo in touched:
+                    near.add(emo, text)
+            kept = [c for c in candidates if near.add(c["emotion"], c["template"])]
+            counts["near_duplicates"] = len(candidates) - len(kept)
+            candidates = kept
+
+        if not candidates and not removed:
+            self._review(flagged)
+            return {**counts, "added": 0, "removed": 0, "generation": index.generation,
+                    "seconds": round(time.perf_counter() - t0, 3)}
+
+        templates = [c["template"] for c in candidates]
+        emotions = [c["emotion"] for c in candidates]
+        t1 = time.perf_counter()
+        vectors = self.emb.embed_documents(templates) if templates else []
+        embed_s = time.perf_counter() - t1
+
+        nxt = index.with_changes(templates, emotions, vectors, removed)
+        compacted = len(nxt.segments) > self.max_segments or len(nxt.tombstones) > self.max_dead * max(1, len(nxt))
+        if compacted:
+            nxt = nxt.compacted()
+        alive = nxt.alive_rows()
+        nxt.fingerprint = corpus_fingerprint([nxt.templates[r] for r in alive], [nxt.emotions[r] for r in alive],
+                                             self.model_name)
+        self._publish(nxt, alive, flagged)
+        return {**counts, "added": len(templates), "removed": len(removed), "embed_s": round(embed_s, 3),
+                "generation": nxt.generation, "segments": len(nxt.segments), "tombstones": len(nxt.tombstones),
+                "templates": len(alive), "compacted": compacted, "seconds": round(time.perf_counter() - t0, 3)}
+
+    def _publish(self, index, alive: list[int], flagged: list[dict]):
+        # index first (readers switch on meta.json), then the corpus file a restart would read
+        index.save(self.index_dir)
+        _write_json(self.corpus_path, [{"emotion": index.emotions[r], "template": index.templates[r]} for r in alive])
+        self._review(flagged)
+
+    def _review(self, flagged: list[dict]):
+        """Append safety-flagged additions to the review file, as `prep corpus` does."""
+        if flagged:
+            try:
+                review = json.loads(self.review_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                review = []
+            _write_json(self.review_path, review + flagged)
+
+    def update(self, add=(), remove=()) -> dict:
+        """Add raw {"emotion", "template"} records and remove others (matched after cleaning)."""
+        pairs = [(str(r.get("emotion", "")).strip().lower(), clean_text(str(r.get("template", "")).strip()))
+                 for r in remove]
+        with self._locked():
+            return self._apply(validate_records(list(add)), pairs)
+
+    def sync(self, raw_path: Path) -> dict:
+        """Make the index match a full raw corpus file, processing only records changed since the last sync."""
+        records = {raw_key(r): r for r in iter_records(Path(raw_path))}
+        with self._locked():
+            try:
+                manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                manifest = {}   # first sync: everything is "new", but already indexed templates dedupe exactly
+            new_keys = [k for k in records if k not in manifest]
+            gone = [k for k in manifest if k not in records]
+            validated = validate_records([records[k] for k in new_keys])
+
+            still = Counter(tuple(v) for k, v in manifest.items() if v and k in records)
+            still.update((res[1]["emotion"], res[1]["template"]) for res in validated if res)
+            remove = [tuple(manifest[k]) for k in gone if manifest[k] and not still[tuple(manifest[k])]]
+
+            report = self._apply(validated, list(dict.fromkeys(remove)))
+            for k in gone:
+                manifest.pop(k)
+            for k, res in zip(new_keys, validated):
+                manifest[k] = [res[1]["emotion"], res[1]["template"]] if res else None
+            _write_json(self.manifest_path, manifest, indent=None)
+        return {"new_records": len(new_keys), "deleted_records": len(gone), **report}
+
+    def compact(self) -> dict:
+        from .retriever import corpus_fingerprint
+
+        with self._locked():
+            t0 = time.perf_counter()
+            index = self._current().compacted()
+            index.fingerprint = corpus_fingerprint(index.templates, index.emotions, self.model_name)
+            self._publish(index, index.alive_rows(), [])
+            return {"generation": index.generation, "templates": len(index), "seconds": round(time.perf_counter() - t0, 3)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.ingest", description="Incremental template corpus updates")
+    ap.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    ap.add_argument("--corpus", type=Path, default=CORPUS_PATH)
+    ap.add_argument("--review", type=Path, default=CORPUS_REVIEW)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("add", help="clean, flag, dedupe, embed and append templates").add_argument("path", type=Path)
+    sub.add_parser("remove", help="tombstone templates").add_argument("path", type=Path)
+    sub.add_parser("sync", help="apply the changes in a full raw corpus since the last sync").add_argument("path", type=Path)
+    sub.add_parser("compact", help="merge segments and drop tombstoned rows")
+    args = ap.parse_args(argv)
+
+    ing = CorpusIngestor(args.index_dir, args.corpus, args.review)
+    if args.cmd == "add":
+        report = ing.update(add=list(iter_records(args.path)))
+    elif args.cmd == "remove":
+        report = ing.update(remove=list(iter_records(args.path)))
+    elif args.cmd == "sync":
+        report = ing.sync(args.path)
+    else:
+        report = ing.compact()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
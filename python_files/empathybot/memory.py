@@ -0,0 +1,186 @@
+"""
+Per-session conversation memory with a fixed size cap.
+
+Each session keeps a ring buffer of its last `max_turns` turns (bucket, rounded
+confidence, a few keywords, ids of the templates used) and a rolling summary
+built from them, serialized as compact JSON of at most `max_bytes`. Stores only
+hold those bytes, so memory is bounded by sessions × max_bytes:
+
+    InProcessStore(max_sessions=10_000, ttl=6h)     LRU dict (default)
+    SQLiteSessionStore(path, ttl, max_sessions)     shared across processes (EMPATHYBOT_MEMORY_DB)
+
+respond(msg, session_id=...) reads the state before answering and records the
+turn afterwards. The state feeds retrieval (templates used in recent turns are
+skipped) and the prompt (one "Context:" line with the summary).
+"""
+import hashlib, json, sqlite3, threading, time
+from collections import Counter, OrderedDict, deque
+from pathlib import Path
+
+from .text import keyword_set
+
+def template_id(template: str) -> str:
+    """Short, stable id of a template (its text may be long)."""
+    return hashlib.blake2b(template.encode("utf-8"), digest_size=4).hexdigest()
+
+class SessionState:
+    def __init__(self, max_turns: int = 8, turns=None):
+        self.turns: deque = deque(turns or (), maxlen=max_turns)   # dicts: b, c, kw, tpl, ts
+
+    def add_turn(self, bucket: str, conf: float, user_text: str, templates: list[str], max_keywords: int = 5):
+        kws = sorted(keyword_set(user_text), key=lambda w: (-len(w), w))[:max_keywords]
+        self.turns.append({"b": bucket, "c": round(float(conf), 2), "kw": kws,
+                           "tpl": [template_id(t) for t in templates], "ts": int(time.time())})
+
+    @property
+    def trajectory(self) -> list[str]:
+        return [t["b"] for t in self.turns]
+
+    def recent_template_ids(self, last: int = 3) -> set[str]:
+        return {i for t in list(self.turns)[-last:] for i in t["tpl"]}
+
+    def summary(self, max_topics: int = 5, max_chars: int = 200) -> str:
+        """Rolling summary: how the feeling moved over recent turns and what they were about."""
+        if not self.turns:
+            return ""
+        traj = []
+        for b in self.trajectory:
+            if not traj or traj[-1] != b:
+                traj.append(b)
+        topics = Counter(w for t in self.turns for w in t["kw"])
+        text = "earlier the user felt " + " → ".join(traj[-4:])
+        if topics:
+            text += "; topics: " + ", ".join(w for w, _ in topics.most_common(max_topics))
+        return text[:max_chars]
+
+    def dumps(self, max_bytes: int) -> bytes:
+        """Serialize, dropping the oldest turns until it fits in max_bytes."""
+        turns = list(self.turns)
+        while True:
+            data = json.dumps({"v": 1, "turns": turns}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            if len(data) <= max_bytes or not turns:
+                return data
+            turns.pop(0)
+
+    @classmethod
+    def loads(cls, data: bytes | None, max_turns: int):
+        if not data:
+            return cls(max_turns)
+        try:
+            return cls(max_turns, json.loads(data)["turns"])
+        except (ValueError, KeyError, TypeError):
+            return cls(max_turns)
+
+class InProcessStore:
+    """LRU of serialized states with an idle TTL; evicts the least recently used session past max_sessions."""
+
+    def __init__(self, max_sessions: int = 10_000, ttl: float | None = 6 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()   # id -> (last_used, bytes)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> bytes | None:
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return None
+            if self.ttl and item[0] + self.ttl < time.monotonic():
+                del self._data[session_id]
+                return None
+            self._data.move_to_end(session_id)
+            return item[1]
+
+    def put(self, session_id: str, data: bytes):
+        with self._lock:
+            self._data[session_id] = (time.monotonic(), data)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteSessionStore:
+    """
+    Sessions in one SQLite table (several server processes can share it). Every
+    `purge_every` writes (and on the first one) purge() deletes expired rows and
+    the least recently written sessions past max_sessions.
+    """
+
+    def __init__(self, path: Path, ttl: float | None = 6 * 3600, max_sessions: int | None = 10_000,
+                 purge_every: int = 256):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB, updated REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def get(self, session_id: str) -> bytes | None:
+        with self._lock:
+            row = self._db.execute("SELECT data, updated FROM sessions WHERE id=?", (session_id,)).fetchone()
+        if row is None or (self.ttl and row[1] + self.ttl < time.time()):
+            return None
+        return row[0]
+
+    def put(self, session_id: str, data: bytes):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?,?,?)",
+                             (session_id, data, time.time()))
+            due = self._writes % self.purge_every == 0
+            self._writes += 1
+        if due:
+            self.purge()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id=?", (session_id,))
+
+    def purge(self) -> int:
+        """Delete expired sessions and the oldest ones past max_sessions; returns how many rows went."""
+        with self._lock:
+            deleted = 0
+            if self.ttl:
+                deleted += self._db.execute("DELETE FROM sessions WHERE updated < ?",
+                                            (time.time() - self.ttl,)).rowcount
+            if self.max_sessions is not None:
+                deleted += self._db.execute(
+                    "DELETE FROM sessions WHERE id IN "
+                    "(SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,)).rowcount
+            return deleted
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+class ConversationMemory:
+    def __init__(self, store=None, max_turns: int = 8, max_bytes: int = 2048):
+        self.store = store if store is not None else InProcessStore()
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+
+    def load(self, session_id: str) -> SessionState:
+        return SessionState.loads(self.store.get(session_id), self.max_turns)
+
+    def record(self, session_id: str, state: SessionState, user_text: str, result: dict):
+        state.add_turn(result.get("bucket", "neutral"), result.get("confidence") or 0.0, user_text,
+                       result.get("templates") or [])
+        self.store.put(session_id, state.dumps(self.max_bytes))
+
+    def forget(self, session_id: str):
+        self.store.delete(session_id)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.store), "max_turns": self.max_turns, "max_bytes": self.max_bytes,
+                "store": type(self.store).__name__}
@@ -0,0 +1,249 @@
+"""
+Offline dataset prep (was the top half of the Colab notebook).
+
+    python -m empathybot.prep tweet-eval            # tweet_eval/emotion → one merged, cleaned parquet + csv
+    python -m empathybot.prep files a.parquet b.csv --out-dir parts/   # any labelled files, resumable
+    python -m empathybot.prep corpus                # corpus.json(l) → corpus_clean.json + corpus_flagged.json
+    python -m empathybot.prep utterances            # utterance pool for template mining
+
+The serving runtime never imports this module.
+"""
+import argparse, itertools, json, random
+from collections import Counter
+from pathlib import Path
+
+from .config import DATA_DIR, CORPUS_RAW, CORPUS_PATH, CORPUS_REVIEW, VALID_EMOS, MAP6to4
+from .dedupe import NearDupFilter
+from .prep_stream import ArrowSource, PrepRun, chunked, clean_chunk, ordered_map
+from .safety import CRISIS_PATTERNS, PROFANITY, SAFETY
+from .text import clean_text
+
+MIN_LEN, MAX_LEN = 8, 180
+ENABLE_NEAR_DUP = True
+NEAR_DUP_JACCARD = 0.85   # 0..1 (higher = stricter)
+NEAR_DUP_VERIFY = True    # confirm MinHash/LSH candidates with the exact Jaccard
+TARGET_PER = None         # e.g., 250 to rebalance, or None to keep counts
+
+def is_flagged(s: str) -> bool:
+    """Crisis or profanity match (see safety.SAFETY.categories() for which)."""
+    return SAFETY.matches(s)
+
+# === tweet_eval/emotion — ONE merged, cleaned file (no split info kept) ===
+def as_clean_df(ds, split_name: str, id2name: dict):
+    """One whole split in memory (prepare_tweet_eval streams instead)."""
+    d = clean_chunk(ds[split_name].to_pandas(), id2name)
+    return d.drop_duplicates(subset=["text"]).reset_index(drop=True)
+
+def report_parts(run: PrepRun) -> dict:
+    """Label distributions over all part files, one part in memory at a time."""
+    import pandas as pd
+
+    dist6, dist4, rows = Counter(), Counter(), 0
+    for p in run.part_files():
+        d = pd.read_parquet(p, columns=["label_name", "label_4"])
+        dist6.update(d["label_name"].dropna()); dist4.update(d["label_4"]); rows += len(d)
+    return {"rows": rows, "label_name": dict(dist6.most_common()), "label_4": dict(dist4.most_common())}
+
+def prepare_tweet_eval(out_dir: Path = DATA_DIR, batch_size: int = 10_000, workers: int = 1):
+    from datasets import load_dataset
+
+    ds = load_dataset("tweet_eval", "emotion")
+
+    # Stream each split in Arrow batches: clean + label per chunk, global dedupe, parquet parts
+    run = PrepRun(out_dir / "tweet_eval_emotion_parts", batch_size=batch_size, workers=workers)
+    for s in ("train","validation","test"):
+        run.add(ArrowSource.from_hf(ds[s], f"tweet_eval/emotion:{s}"))
+
+    # Save a single merged artifact
+    out_parquet = out_dir / "tweet_eval_emotion_merged_clean.parquet"
+    out_csv     = out_dir / "tweet_eval_emotion_merged_clean.csv"
+    run.export(out_parquet, out_csv)
+
+    report = report_parts(run)
+    print("Rows:", report["rows"])
+    print("6-class dist:", report["label_name"])
+    print("4-class dist:", report["label_4"])
+    print("Saved:", out_parquet, "and", out_csv)
+    return report
+
+def prepare_files(paths: list[Path], out_dir: Path, batch_size: int = 10_000, export: bool = False,
+                  workers: int = 1, label_names: list[str] | None = None):
+    """
+    Labelled parquet/csv/jsonl files (text + label_name, or label ids + label_names) → resumable parquet parts.
+    Raises ValueError for label ids that label_names does not name.
+    """
+    run = PrepRun(out_dir, batch_size=batch_size, workers=workers)
+    id2name = dict(enumerate(label_names or []))
+    for p in paths:
+        run.add(ArrowSource.from_path(p, id2name))
+    if export:
+        run.export(out_dir / "merged_clean.parquet", out_dir / "merged_clean.csv")
+    report = report_parts(run)
+    print("Report:", report)
+    return report
+
+# === RAG corpus cleaning ===
+def iter_records(path: Path):
+    """Raw corpus records: a JSON array, or JSON Lines (*.jsonl) read one line at a time."""
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from json.loads(path.read_text(encoding="utf-8"))
+
+def validate_records(records: list[dict]) -> list[tuple[bool, dict] | None]:
+    """Per raw record: None (invalid), (False, item) flagged for review, or (True, item) kept."""
+    out = []
+    for r in records:
+        emo = str(r.get("emotion","")).strip().lower()
+        txt = str(r.get("template","")).strip()
+        if emo not in VALID_EMOS or not txt:
+            out.append(None); continue
+        txt = clean_text(txt)
+        if not (MIN_LEN <= len(txt) <= MAX_LEN):
+            out.append(None); continue
+        item = {"emotion": emo, "template": txt}
+        flag = SAFETY.first(txt)
+        if flag:
+            item["flag"] = flag
+        out.append((flag is None, item))
+    return out
+
+def clean_corpus(in_path: Path = CORPUS_RAW, out_path: Path = CORPUS_PATH, review_path: Path = CORPUS_REVIEW,
+                 verify: bool = NEAR_DUP_VERIFY, workers: int = 1, chunk_size: int = 2000):
+    counts = Counter()
+    flagged = []
+
+    # 1) Validate & clean (chunks across `workers` processes; results stay in input order)
+    def valid(records):
+        for results in ordered_map(validate_records, chunked(records, chunk_size), workers):
+            counts["input"] += len(results)
+            for res in results:
+                if res is None:
+                    continue
+                ok, item = res
+                if ok:
+                    yield item
+                else:
+                    flagged.append(item)
+
+    # 2) Exact dedupe (per emotion+template)
+    def exact_unique(records):
+        seen = set()
+        for r in records:
+            key = (r["emotion"], r["template"])
+            if key in seen:
+                continue
+            seen.add(key)
+            yield r
+
+    rows = exact_unique(valid(iter_records(in_path)))
+
+    # 3) Near-dup removal (same emotion bucket), MinHash/LSH instead of all-pairs jaccard()
+    near_dup = None
+    if ENABLE_NEAR_DUP:
+        near_dup = NearDupFilter(threshold=NEAR_DUP_JACCARD, verify=verify)
+        rows = near_dup.filter(rows, bucket=lambda r: r["emotion"], text=lambda r: r["template"])
+    rows = list(rows)
+
+    # 4) Optional rebalance
+    if TARGET_PER:
+        buckets = {e: [] for e in VALID_EMOS}
+        for r in rows: buckets[r["emotion"]].append(r)
+        for e in buckets:
+            random.shuffle(buckets[e]); buckets[e] = buckets[e][:TARGET_PER]
+        rows = [x for e in VALID_EMOS for x in buckets[e]]
+
+    # 5) Save & small report
+    out_path.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    review_path.write_text(json.dumps(flagged, ensure_ascii=False, indent=2), encoding="utf-8")
+    report = {"input_total": counts["input"],
+              "kept_total": len(rows),
+              "flagged_total": len(flagged),
+              "flagged_by_category": dict(Counter(r["flag"] for r in flagged)),
+              "kept_by_emotion": dict(Counter([r["emotion"] for r in rows]))}
+    print("Report:", report)
+    if near_dup is not None:
+        report["near_dup"] = near_dup.report()
+        print("Near-dup:", {e: {k: s[k] for k in ("dropped", "pairs_compared", "pairs_pruned")}
+                            for e, s in report["near_dup"]["buckets"].items()})
+    print("Wrote:", out_path, "and flagged:", review_path)
+    return report
+
+# === Utterance pool ===
+def collect_utterances(ds, max_per_split=10000, min_len=3, max_len=300):
+    def get_text(ex):
+        for k in ("utterance", "text", "context"):
+            v = ex.get(k)
+            if isinstance(v, str) and v.strip():
+                return v.strip()
+        return ""
+    seen, uniq = set(), []
+    for split in ["train","validation","test"]:
+        if split not in ds:
+            continue
+        for ex in itertools.islice(ds[split], max_per_split):
+            txt = get_text(ex)
+            if min_len <= len(txt) <= max_len and txt not in seen:
+                uniq.append(txt); seen.add(txt)
+    random.shuffle(uniq)
+    return uniq
+
+def prepare_utterances(dataset: str, config: str | None, out_path: Path, max_per_split: int = 10000):
+    from datasets import load_dataset
+
+    ds = load_dataset(dataset, config) if config else load_dataset(dataset)
+    candidates = collect_utterances(ds, max_per_split=max_per_split)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(candidates, ensure_ascii=False, indent=2), encoding="utf-8")
+    print("Utterances:", len(candidates), "→", out_path)
+    return candidates
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.prep", description="Offline EmpathyBot dataset prep")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes for cleaning/flagging/labelling (output is identical to 1)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("tweet-eval", help="merge + clean tweet_eval/emotion")
+    p.add_argument("--out-dir", type=Path, default=DATA_DIR)
+    p.add_argument("--batch-size", type=int, default=10_000)
+
+    p = sub.add_parser("files", help="stream labelled parquet/csv/jsonl files into resumable parquet parts")
+    p.add_argument("inputs", nargs="+", type=Path)
+    p.add_argument("--out-dir", type=Path, required=True)
+    p.add_argument("--batch-size", type=int, default=10_000)
+    p.add_argument("--export", action="store_true", help="also write merged_clean.parquet/.csv")
+    p.add_argument("--label-names", default="anger,joy,optimism,sadness",
+                   help="comma-separated names for integer `label` ids (tweet_eval/emotion order)")
+
+    p = sub.add_parser("corpus", help="clean the RAG template corpus")
+    p.add_argument("--in", dest="in_path", type=Path, default=CORPUS_RAW)
+    p.add_argument("--out", type=Path, default=CORPUS_PATH)
+    p.add_argument("--review", type=Path, default=CORPUS_REVIEW)
+    p.add_argument("--no-verify", action="store_true",
+                   help="drop near-dups on the MinHash estimate instead of the exact Jaccard")
+    p.add_argument("--chunk-size", type=int, default=2000, help="records per worker task")
+
+    p = sub.add_parser("utterances", help="collect a shuffled, deduped utterance pool")
+    p.add_argument("--dataset", default="tweet_eval")
+    p.add_argument("--config", default="emotion")
+    p.add_argument("--out", type=Path, default=DATA_DIR / "utterances.json")
+    p.add_argument("--max-per-split", type=int, default=10000)
+
+    args = ap.parse_args(argv)
+    if args.cmd == "tweet-eval":
+        prepare_tweet_eval(args.out_dir, args.batch_size, args.workers)
+    elif args.cmd == "files":
+        prepare_files(args.inputs, args.out_dir, args.batch_size, args.export, args.workers,
+                      args.label_names.split(","))
+    elif args.cmd == "corpus":
+        clean_corpus(args.in_path, args.out, args.review, verify=not args.no_verify,
+                     workers=args.workers, chunk_size=args.chunk_size)
+    elif args.cmd == "utterances":
+        prepare_utterances(args.dataset, args.config or None, args.out, args.max_per_split)
+
+if __name__ == "__main__":
+    main()
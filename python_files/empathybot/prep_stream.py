@@ -0,0 +1,310 @@
+"""
+Streaming, resumable dataset prep: Arrow record batches in, partitioned parquet out.
+
+    run = PrepRun(out_dir, batch_size=10_000)
+    run.add(ArrowSource.from_parquet(path))        # or from_csv / from_jsonl / from_hf(ds[split], name)
+    run.export("merged.parquet", "merged.csv")     # optional single-file copy, streamed part by part
+
+Each input is read one record batch at a time, cleaned/labelled (clean_chunk),
+deduplicated against every row kept so far (64-bit text hashes), and written as
+its own part file. Memory is bounded by one batch plus the seen-hash set.
+
+Layout of out_dir:
+    manifest.json                   inputs in order, by content key: chunks done, rows in/out
+    part-<key>-<chunk>.parquet      kept rows of one chunk (read the dir for the whole dataset)
+    seen-<key>-<chunk>.npy          text hashes first kept in that chunk
+
+Part/seen files are written before the manifest is updated, so an interrupted run
+resumes at the first unfinished chunk of the first unfinished input; inputs whose
+content key is already complete are skipped.
+"""
+import hashlib, itertools, json, os, tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .config import MAP6to4
+from .text import clean_series
+
+COLUMNS = ["text_raw", "text", "label", "label_name", "label_4"]
+MIN_CHARS, MAX_CHARS = 3, 300
+
+def file_key(path: Path, block: int = 1 << 20) -> str:
+    """Content hash of a file (streamed)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+def text_hashes(texts) -> np.ndarray:
+    return np.fromiter((int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+                        for t in texts), dtype=np.uint64, count=len(texts))
+
+class ArrowSource:
+    """A named input that yields pyarrow Tables/RecordBatches of at most `batch_size` rows."""
+
+    def __init__(self, key: str, name: str, batches, id2name: dict | None = None):
+        self.key = key              # content hash / dataset fingerprint
+        self.name = name
+        self._batches = batches     # callable(batch_size) -> iterator
+        self.id2name = id2name or {}
+
+    def batches(self, batch_size: int):
+        return self._batches(batch_size)
+
+    @classmethod
+    def from_path(cls, path: Path, id2name: dict | None = None):
+        suffix = Path(path).suffix.lower()
+        if suffix == ".parquet": return cls.from_parquet(path, id2name)
+        if suffix == ".csv": return cls.from_csv(path, id2name)
+        if suffix == ".jsonl": return cls.from_jsonl(path, id2name)
+        raise ValueError(f"unsupported input {path} (expected .parquet, .csv or .jsonl)")
+
+    @classmethod
+    def from_parquet(cls, path: Path, id2name: dict | None = None):
+        import pyarrow.parquet as pq
+        path = Path(path)
+        return cls(file_key(path), path.name, lambda n: pq.ParquetFile(path).iter_batches(batch_size=n), id2name)
+
+    @classmethod
+    def from_csv(cls, path: Path, id2name: dict | None = None):
+        import pyarrow.csv as pcsv
+        path = Path(path)
+
+        def batches(n):
+            # the CSV reader yields blocks by size; rebatch to n rows so chunk boundaries stay stable
+            reader = pcsv.open_csv(path, convert_options=pcsv.ConvertOptions(strings_can_be_null=False))
+            yield from _rebatch(reader, n)
+        return cls(file_key(path), path.name, batches, id2name)
+
+    @classmethod
+    def from_jsonl(cls, path: Path, id2name: dict | None = None):
+        import pyarrow as pa
+        path = Path(path)
+
+        def batches(n):
+            rows = []
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rows.append(json.loads(line))
+                        if len(rows) == n:
+                            yield pa.Table.from_pylist(rows); rows = []
+            if rows:
+                yield pa.Table.from_pylist(rows)
+        return cls(file_key(path), path.name, batches, id2name)
+
+    @classmethod
+    def from_hf(cls, split, name: str, revision: str | None = None):
+        """
+        A 🤗 datasets split, read as Arrow tables without to_pandas(). Keyed by
+        what load_dataset() was asked for (dataset, config, split, revision) plus
+        the version, features and row count it returned.
+        """
+        names = split.features["label"].names if "label" in split.features else []
+        info = split.info
+        ident = {"dataset": info.dataset_name, "config": info.config_name, "split": str(split.split),
+                 "revision": revision, "version": str(info.version) if info.version else None,
+                 "features": split.features.to_dict(), "rows": split.num_rows}
+        key = hashlib.sha256(json.dumps(ident, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return cls(key, name, lambda n: split.with_format("arrow").iter(batch_size=n), dict(enumerate(names)))
+
+def _rebatch(batches, n: int):
+    import pyarrow as pa
+    pending, size = [], 0
+    for b in batches:
+        while b.num_rows:
+            take = b.slice(0, n - size)
+            pending.append(take); size += take.num_rows
+            b = b.slice(take.num_rows)
+            if size == n:
+                yield pa.Table.from_batches(pending); pending, size = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+def clean_chunk(table, id2name: dict):
+    """One chunk → DataFrame[COLUMNS]: cleaned text, 6-class label name, 4-bucket, length filter."""
+    import pandas as pd
+
+    d = table.to_pandas() if not isinstance(table, pd.DataFrame) else table.copy()
+    d["text_raw"] = d["text"]
+    d["text"] = clean_series(d["text"])
+    if "label_name" not in d:
+        if "label" not in d:
+            raise ValueError("input needs a label_name column or integer label ids")
+        unknown = set(d["label"].dropna().unique().tolist()) - set(id2name)
+        if unknown:   # unmapped ids would silently become "neutral" below
+            raise ValueError(f"label ids {sorted(unknown)} have no name; pass label_names (in id order)")
+        d["label_name"] = d["label"].map(id2name)
+    d["label"] = d["label"].astype("Int64") if "label" in d else pd.array([pd.NA] * len(d), dtype="Int64")
+    d["label_4"] = d["label_name"].map(MAP6to4).fillna("neutral")
+    d = d[(d["text"].str.len() >= MIN_CHARS) & (d["text"].str.len() <= MAX_CHARS)]
+    return d[COLUMNS].reset_index(drop=True)
+
+def chunked(items, size: int):
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+def ordered_map(fn, items, workers: int = 1, prefetch: int = 2):
+    """
+    fn(item) for each item, results in input order. workers <= 1 runs inline;
+    otherwise a process pool with at most workers*prefetch items in flight, so
+    a long input is never materialized. fn and items must be picklable.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= workers * prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _apply_chunk(job):
+    fn, batch, id2name = job
+    return fn(batch, id2name)
+
+def _atomic(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+class PrepRun:
+    def __init__(self, out_dir: Path, batch_size: int = 10_000, chunk_fn=clean_chunk, workers: int = 1):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.chunk_fn = chunk_fn       # runs in worker processes when workers > 1 (must be picklable)
+        self.workers = workers
+        self.manifest = self._load_manifest()
+        self.seen: set[int] = set()
+        for inp in self.manifest["inputs"]:
+            for c in range(inp["chunks_done"]):
+                p = self.out_dir / f"seen-{inp['key'][:16]}-{c:06d}.npy"
+                if p.exists():
+                    self.seen.update(np.load(p).tolist())
+
+    def _load_manifest(self) -> dict:
+        p = self.out_dir / "manifest.json"
+        if p.exists():
+            m = json.loads(p.read_text(encoding="utf-8"))
+            if m.get("batch_size") != self.batch_size:
+                raise ValueError(f"{p} was written with batch_size={m.get('batch_size')}; "
+                                 f"resume with the same batch size or use a new out_dir")
+            return m
+        return {"batch_size": self.batch_size, "inputs": []}
+
+    def _save_manifest(self):
+        text = json.dumps(self.manifest, ensure_ascii=False, indent=2)
+        _atomic(self.out_dir / "manifest.json", lambda tmp: Path(tmp).write_text(text, encoding="utf-8"))
+
+    def _entry(self, src: ArrowSource) -> dict:
+        for inp in self.manifest["inputs"]:
+            if inp["key"] == src.key:
+                return inp
+        inp = {"key": src.key, "name": src.name, "chunks_done": 0, "rows_in": 0, "rows_out": 0, "complete": False}
+        self.manifest["inputs"].append(inp)
+        return inp
+
+    def chunks(self, src: ArrowSource, start: int = 0):
+        """(index, raw chunk) pairs of `src` from chunk `start` on."""
+        for i, batch in enumerate(src.batches(self.batch_size)):
+            if i >= start:
+                yield i, batch
+
+    def dedupe(self, df):
+        """Drop rows whose text was kept before (globally, across inputs); returns (df, new hashes)."""
+        if df.empty:
+            return df, np.empty(0, dtype=np.uint64)
+        hashes = text_hashes(df["text"].tolist())
+        keep = np.zeros(len(hashes), dtype=bool)
+        for i, h in enumerate(hashes.tolist()):
+            if h not in self.seen:
+                self.seen.add(h)
+                keep[i] = True
+        return df[keep].reset_index(drop=True), hashes[keep]
+
+    def commit_chunk(self, src: ArrowSource, inp: dict, index: int, rows_in: int, cleaned):
+        df, new = self.dedupe(cleaned)
+        tag = f"{src.key[:16]}-{index:06d}"
+        if len(df):
+            _atomic(self.out_dir / f"part-{tag}.parquet", lambda tmp: df.to_parquet(tmp, index=False))
+            def save_seen(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, new)
+            _atomic(self.out_dir / f"seen-{tag}.npy", save_seen)
+        inp["chunks_done"] = index + 1
+        inp["rows_in"] += rows_in
+        inp["rows_out"] += len(df)
+        self._save_manifest()
+
+    def add(self, src: ArrowSource) -> dict:
+        """Process one input (skipped if complete, resumed if partial)."""
+        inp = self._entry(src)
+        if inp["complete"]:
+            print("Skip (already processed):", src.name)
+            return inp
+        # clean/label in parallel, dedupe + write in order here → same parts as a serial run
+        start = inp["chunks_done"]
+        batches = (b for _, b in self.chunks(src, start))
+        jobs = ((self.chunk_fn, b, src.id2name) for b in batches)
+        sizes = deque()
+        def counted(jobs):
+            for job in jobs:
+                sizes.append(job[1].num_rows)
+                yield job
+        for index, cleaned in enumerate(ordered_map(_apply_chunk, counted(jobs), self.workers), start):
+            self.commit_chunk(src, inp, index, sizes.popleft(), cleaned)
+        inp["complete"] = True
+        self._save_manifest()
+        print(f"{src.name}: {inp['rows_in']} rows in, {inp['rows_out']} kept ({inp['chunks_done']} chunks)")
+        return inp
+
+    def part_files(self) -> list[Path]:
+        """Part files in input, then chunk order."""
+        files = []
+        for inp in self.manifest["inputs"]:
+            for c in range(inp["chunks_done"]):
+                p = self.out_dir / f"part-{inp['key'][:16]}-{c:06d}.parquet"
+                if p.exists():
+                    files.append(p)
+        return files
+
+    def export(self, parquet_path: Path | None = None, csv_path: Path | None = None) -> int:
+        """Concatenate all parts (in order) into single parquet/csv files, one part in memory at a time."""
+        import pandas as pd, pyarrow as pa, pyarrow.parquet as pq
+
+        writer, rows = None, 0
+        for out in (parquet_path, csv_path):   # never leave a previous run's file behind
+            if out and Path(out).exists():
+                Path(out).unlink()
+        for p in self.part_files():
+            df = pd.read_parquet(p)
+            if parquet_path:
+                t = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(str(parquet_path), t.schema)
+                writer.write_table(t.cast(writer.schema))
+            if csv_path:
+                df.to_csv(csv_path, index=False, mode="a", header=rows == 0)
+            rows += len(df)
+        if writer:
+            writer.close()
+        # no parts: empty files, not missing (or stale) ones
+        if parquet_path and writer is None:
+            pd.DataFrame(columns=COLUMNS).to_parquet(parquet_path, index=False)
+        if csv_path and not rows:
+            pd.DataFrame(columns=COLUMNS).to_csv(csv_path, index=False)
+        return rows
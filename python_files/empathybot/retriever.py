@@ -0,0 +1,336 @@
+"""
+Template retrieval: per-emotion partitioned index over the cleaned corpus + on-topic pruning.
+
+mode="dense" (default) is the embeddings-only path. mode="hybrid" (opt-in,
+EMPATHYBOT_RETRIEVAL=hybrid) ranks each bucket twice, by embedding similarity
+and by BM25 over the template keyword sets, and fuses the two lists with
+reciprocal rank fusion before pruning. `fetch` is the candidate budget per
+ranking, × k.
+"""
+import hashlib, json, pickle
+from pathlib import Path
+
+from .config import CORPUS_PATH, INDEX_PATH, INDEX_DIR, META_PATH, EMB_MODEL, RETRIEVAL_MODE
+from .text import clean_text, keyword_set
+
+# Emotion-specific safe fallback lines (used if retrieval is poor)
+FALLBACKS = {
+    "happiness": [
+        "That’s wonderful—what’s making you smile most right now?",
+        "Congrats! What are you most proud of?"
+    ],
+    "sadness": [
+        "I’m really sorry you’re feeling this way. Want to share what’s weighing on you?",
+        "That sounds heavy. I’m here to listen—what happened?"
+    ],
+    "anger": [
+        "I hear your frustration. What felt most unfair about it?",
+        "That sounds upsetting. What triggered it the most?"
+    ],
+    "neutral": [
+        "Thanks for sharing. Want to tell me more so I can understand better?",
+        "I’m listening—what matters most about this for you?"
+    ],
+}
+
+# Template words that mark an obvious mismatch unless the user mentions them too
+OFF_TOPIC_TERMS = frozenset({"exam","degree","lunch","todayl"})
+MIN_TEMPLATE_WORDS = 5   # very short fragments aren’t helpful
+
+def keywords_on_topic(ttoks, utoks, min_overlap: int = 1, off_topic_terms=OFF_TOPIC_TERMS) -> bool:
+    """is_on_topic() on precomputed keyword sets."""
+    if not ttoks: return False
+    # overlap
+    if len(utoks & ttoks) < min_overlap and len(utoks) >= 3:
+        return False
+    # avoid obvious mismatches (exam/degree/lunch unless user mentions them)
+    if (ttoks & off_topic_terms) and not (utoks & off_topic_terms):
+        return False
+    return True
+
+def is_on_topic(template: str, user_text: str, min_overlap: int = 1, off_topic_terms=None):
+    return keywords_on_topic(keyword_set(template), keyword_set(user_text), min_overlap,
+                             frozenset(off_topic_terms or OFF_TOPIC_TERMS))
+
+def load_corpus(path: Path = CORPUS_PATH):
+    """corpus_clean.json → list[Document] (page_content=cleaned template, metadata.emotion)."""
+    from langchain_core.documents import Document
+
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    return [Document(page_content=clean_text(r["template"]),
+                     metadata={"emotion": r["emotion"].lower().strip()}) for r in corpus]
+
+def corpus_fingerprint(templates: list[str], emotions: list[str], model_name: str) -> str:
+    """Content hash of the indexed (template, emotion) pairs + embedding model name."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for t, e in zip(templates, emotions):
+        h.update(b"\x00" + e.encode("utf-8") + b"\x01" + t.encode("utf-8"))
+    return h.hexdigest()
+
+def _legacy_vectors(fingerprint: str, n_docs: int, model_name: str,
+                    index_path: Path = INDEX_PATH, meta_path: Path = META_PATH):
+    """Vectors from a FAISS faiss.index/faiss_meta.pkl pair (e.g. the one shipped in Data/) if it matches."""
+    try:
+        import faiss
+    except ImportError:
+        return None
+    if not (index_path.exists() and meta_path.exists()):
+        return None
+    try:
+        with open(meta_path, "rb") as f:
+            meta = pickle.load(f)
+        index = faiss.read_index(str(index_path))
+    except Exception as e:
+        print("Legacy FAISS index unreadable, ignoring:", e)
+        return None
+    # Older meta files carry only templates/emotions; hash those against the expected model.
+    stored = meta.get("fingerprint") or corpus_fingerprint(
+        meta.get("templates", []), meta.get("emotions", []), meta.get("embedding_model", model_name))
+    if stored != fingerprint or index.ntotal != n_docs:
+        return None
+    return index.reconstruct_n(0, index.ntotal)
+
+def load_or_build_index(docs, emb, model_name: str = EMB_MODEL, directory: Path = INDEX_DIR):
+    """
+    Open the partitioned index in `directory` when it matches the corpus + embedding
+    model; otherwise build it (reusing a matching legacy FAISS index, else embedding
+    the corpus) and persist it atomically.
+    """
+    from .index import SegmentedIndex
+
+    templates = [d.page_content for d in docs]
+    emotions = [d.metadata["emotion"] for d in docs]
+    fingerprint = corpus_fingerprint(templates, emotions, model_name)
+
+    index = SegmentedIndex.load(directory)
+    if index is not None and index.fingerprint == fingerprint:
+        print("Loaded template index:", index.n_alive, "←", index.path)
+        return index
+
+    vectors = _legacy_vectors(fingerprint, len(docs), model_name)
+    source = "legacy FAISS index"
+    if vectors is None:
+        vectors = emb.embed_documents(templates)
+        source = model_name
+    SegmentedIndex.build(templates, emotions, vectors, fingerprint, model_name).save(directory)
+    index = SegmentedIndex.load(directory)
+    print("Built template index:", len(index), "from", source, "→", index.path)
+    return index
+
+def build_langchain_vstore(index, emb):
+    """LangChain FAISS view over the same vectors (for callers that still want `vstore`)."""
+    import faiss, numpy as np
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+    alive = index.alive_rows()   # tombstoned templates stay out of the LangChain view
+    flat = faiss.IndexFlatIP(index.dim)
+    flat.add(np.ascontiguousarray(index.vectors[alive], dtype="float32"))
+    docs = [Document(page_content=index.templates[r], metadata={"emotion": index.emotions[r]}) for r in alive]
+    return FAISS(
+        embedding_function=emb,
+        index=flat,
+        docstore=InMemoryDocstore({str(i): d for i, d in enumerate(docs)}),
+        index_to_docstore_id={i: str(i) for i in range(len(docs))},
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+        normalize_L2=True,
+    )
+
+# Candidates taken from the bucket's partition before on-topic pruning; unfiltered fallback size
+BUCKET_FETCH = 8   # × k
+GLOBAL_K = 8
+# Hybrid: candidates from each of the dense and BM25 rankings (× k); the keyword
+# side already ranks on-topic rows first, so fewer are needed to fill k
+HYBRID_FETCH = 4
+
+class TemplateTable:
+    """
+    Row-aligned template features computed once at load: stripped text, frozen
+    keyword set, word count, and an inverted keyword → rows index. Candidate
+    pruning per request is then set lookups instead of re-tokenizing templates.
+    """
+
+    def __init__(self, templates: list[str], previous: "TemplateTable | None" = None):
+        self.texts = [t.strip() for t in templates]
+        # after an append-only index update the old rows are a prefix: only tokenize the new ones
+        n = len(previous.texts) if previous is not None and previous.texts == self.texts[:len(previous.texts)] else 0
+        self.keywords = (previous.keywords[:n] if n else []) + [keyword_set(t) for t in self.texts[n:]]
+        self.n_words = (previous.n_words[:n] if n else []) + [len(t.split()) for t in self.texts[n:]]
+        self.postings: dict[str, frozenset] = {}
+        for row, kws in enumerate(self.keywords):
+            for w in kws:
+                self.postings.setdefault(w, set()).add(row)
+        self.postings = {w: frozenset(rows) for w, rows in self.postings.items()}
+        self.eligible = frozenset(row for row, (kws, n) in enumerate(zip(self.keywords, self.n_words))
+                                  if kws and n >= MIN_TEMPLATE_WORDS)
+        self.off_topic = frozenset().union(*(self.postings.get(w, ()) for w in OFF_TOPIC_TERMS))
+
+    def allowed_rows(self, utoks: frozenset, min_overlap: int = 1) -> frozenset:
+        """Rows that pass is_on_topic() + the length check for a user with keywords `utoks`."""
+        rows = self.eligible
+        if len(utoks) >= 3:
+            if min_overlap == 1:
+                rows = rows & frozenset().union(*(self.postings.get(w, ()) for w in utoks))
+            else:
+                rows = frozenset(r for r in rows if len(utoks & self.keywords[r]) >= min_overlap)
+        if not (utoks & OFF_TOPIC_TERMS):
+            rows = rows - self.off_topic
+        return rows
+
+def select_templates(hits: list[int], table: TemplateTable, user_text: str, target_emotion_4: str,
+                     k: int = 3) -> list[str]:
+    """Prune ranked hit rows to k on-topic templates, topping up with FALLBACKS for the bucket."""
+    allowed = table.allowed_rows(keyword_set(user_text))
+    out, seen = [], set()
+    for row in hits:
+        if row not in allowed:
+            continue
+        t = table.texts[row]
+        if t in seen:
+            continue
+        seen.add(t); out.append(t)
+        if len(out) >= k:
+            break
+
+    if len(out) < k:
+        # top up with safe fallbacks for the emotion bucket
+        for fb in FALLBACKS.get(target_emotion_4, FALLBACKS["neutral"]):
+            if fb not in seen:
+                out.append(fb)
+                seen.add(fb)
+                if len(out) >= k: break
+    return out[:k]
+
+class RetrievalSnapshot:
+    """One index generation with its row-aligned TemplateTable and BM25 postings; never mutated."""
+
+    def __init__(self, index, previous: "RetrievalSnapshot | None" = None):
+        from .sparse import BM25Index
+
+        self.index = index
+        self.table = TemplateTable(index.templates, previous.table if previous is not None else None)
+        self.bm25 = BM25Index(self.table.keywords, index.partition_rows())
+
+class TemplateRetriever:
+    """
+    MiniLM embeddings + per-emotion partitioned index; use runtime.get_retriever() for the shared instance.
+
+    Index, table and BM25 postings live in one RetrievalSnapshot. reload() swaps
+    in a new snapshot when ingest.py has written a new index generation; a
+    retrieval reads the snapshot once, so requests in flight finish on the
+    generation they started with.
+    """
+
+    def __init__(self, corpus_path: Path = CORPUS_PATH, model_name: str = EMB_MODEL, index_dir: Path = INDEX_DIR,
+                 mode: str = RETRIEVAL_MODE, fetch: int | None = None):
+        import threading
+        from .embeddings import load_embedder
+        from .index import SegmentedIndex
+
+        if mode not in ("hybrid", "dense"):
+            raise ValueError(f"unknown retrieval mode {mode!r} (expected 'hybrid' or 'dense')")
+        self.model_name = model_name
+        self.mode = mode
+        self.fetch = fetch or (HYBRID_FETCH if mode == "hybrid" else BUCKET_FETCH)
+        self.index_dir = Path(index_dir)
+        self.docs = load_corpus(corpus_path)
+        self.emb = load_embedder(model_name)   # query LRU; the shared worker if EMPATHYBOT_EMBED_SOCKET is set
+        self._stamp = SegmentedIndex.stamp(self.index_dir)
+        self._snap = RetrievalSnapshot(load_or_build_index(self.docs, self.emb, model_name, index_dir))
+        self._reload_lock = threading.Lock()
+        self._vstore = None
+
+    @property
+    def index(self):
+        return self._snap.index
+
+    @property
+    def table(self) -> TemplateTable:
+        return self._snap.table
+
+    @property
+    def bm25(self):
+        return self._snap.bm25
+
+    @property
+    def fingerprint(self) -> str:
+        # cached retrievals are only valid for the same index generation and ranking
+        return f"{self._snap.index.fingerprint}:{self.mode}{self.fetch}"
+
+    def reload(self, force: bool = False) -> bool:
+        """Swap to the index in index_dir if it changed on disk; True if a new generation is now live."""
+        from .index import SegmentedIndex
+
+        stamp = SegmentedIndex.stamp(self.index_dir)
+        if stamp is None or (stamp == self._stamp and not force):
+            return False
+        with self._reload_lock:
+            index = SegmentedIndex.load(self.index_dir)
+            if index is None or index.model_name != self.model_name:
+                return False   # half-replaced or built for another model: keep serving the current one
+            self._stamp = stamp
+            old = self._snap
+            if index.fingerprint == old.index.fingerprint and index.generation == old.index.generation:
+                return False
+            self._snap = RetrievalSnapshot(index, old)
+            self._vstore = None
+        print(f"Reloaded template index: generation {index.generation}, {index.n_alive} templates "
+              f"({len(index.segments)} segments, {len(index.tombstones)} tombstones)")
+        return True
+
+    @property
+    def vstore(self):
+        if self._vstore is None:
+            self._vstore = build_langchain_vstore(self.index, self.emb)
+        return self._vstore
+
+    @property
+    def retriever(self):
+        return self.vstore.as_retriever(search_kwargs={"k": GLOBAL_K})
+
+    def after_fork(self):
+        self.emb.after_fork()
+
+    def embed_queries(self, texts: list[str]):
+        from .index import l2_normalize
+        return l2_normalize(self.emb.embed_many(list(texts)))
+
+    def _hits(self, queries, target_emotions_4: list[str], k: int, user_texts: list[str] | None = None,
+              snap: RetrievalSnapshot | None = None) -> list[list[int]]:
+        """
+        Top k*fetch rows inside each query's bucket (one matmul per bucket), global
+        top-8 if none. Hybrid mode also ranks the bucket by BM25 on `user_texts`
+        keywords and returns the RRF-fused order of both lists.
+        """
+        from .sparse import rrf
+
+        snap = snap or self._snap
+        hybrid = self.mode == "hybrid" and user_texts is not None
+        terms = [keyword_set(t) for t in user_texts] if hybrid else None
+        hits: list[list[int]] = [[] for _ in target_emotions_4]
+        by_bucket: dict[str, list[int]] = {}
+        for i, emo in enumerate(target_emotions_4):
+            by_bucket.setdefault(emo, []).append(i)
+        for emo, rows in by_bucket.items():
+            for row, ids in zip(rows, snap.index.search_many(queries[rows], k * self.fetch, emotion=emo)):
+                hits[row] = rrf([ids, snap.bm25.search(terms[row], k * self.fetch, emo)]) if hybrid and ids else ids
+
+        empty = [i for i, h in enumerate(hits) if not h]
+        if empty:
+            for row, ids in zip(empty, snap.index.search_many(queries[empty], GLOBAL_K)):
+                hits[row] = rrf([ids, snap.bm25.search(terms[row], GLOBAL_K)]) if hybrid else ids
+        return hits
+
+    def retrieve_top3(self, user_text: str, target_emotion_4: str, k: int = 3):
+        return self.retrieve_many([user_text], [target_emotion_4], k=k)[0]
+
+    def retrieve_many(self, user_texts: list[str], target_emotions_4: list[str], k: int = 3) -> list[list[str]]:
+        """retrieve_top3() for many queries: one batched embedding pass, one matmul per bucket."""
+        if not user_texts:
+            return []
+        snap = self._snap   # one generation for the whole call, even if reload() swaps meanwhile
+        hits = self._hits(self.embed_queries(user_texts), list(target_emotions_4), k, list(user_texts), snap)
+        return [select_templates(h, snap.table, t, emo, k=k) for h, t, emo in zip(hits, user_texts, target_emotions_4)]
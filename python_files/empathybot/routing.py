@@ -0,0 +1,89 @@
+"""
+Route each message to generation or straight to compose_from_templates().
+
+respond() used to run a full flan-t5 generation and then, whenever the output was
+weak, echoed or leaked the prompt, throw it away and compose from templates. The
+policy predicts the compose case up front from what is known before generation:
+detector confidence, the bucket, and how many retrieved templates were on-topic
+(not FALLBACKS top-ups). Compose-routed messages never call the generator.
+
+    runtime.configure_routing(min_confidence=0.9)     # or enabled=False
+    runtime.route_stats()   # per route: count, p50/p99 latency; generate: fallback rate
+
+EMPATHYBOT_ROUTING=off disables the fast path (always generate).
+Tune with the stats: a high fallback rate on "generate" means the thresholds are
+too strict; complaints about canned replies mean they are too loose.
+"""
+import threading
+from collections import deque
+
+from .retriever import FALLBACKS
+from .util import percentile
+
+COMPOSE, GENERATE = "compose", "generate"
+
+class RoutingPolicy:
+    def __init__(self, enabled: bool = True, min_confidence: float = 0.95,
+                 buckets=("happiness", "sadness", "anger"), min_on_topic: int | None = None,
+                 max_words: int = 12):
+        self.enabled = enabled
+        self.min_confidence = min_confidence   # detector confidence (forced emotions count as 1.0)
+        self.buckets = frozenset(buckets)      # neutral needs the model to say something specific
+        self.min_on_topic = min_on_topic       # retrieved, non-fallback templates; None = all k
+        self.max_words = max_words             # long messages deserve a generated reply
+
+    def route(self, user_message: str, conf: float, bucket: str, cands: list[str], k: int) -> str:
+        if not self.enabled or not cands:
+            return GENERATE
+        if conf < self.min_confidence or bucket not in self.buckets:
+            return GENERATE
+        if len(user_message.split()) > self.max_words:
+            return GENERATE
+        fallbacks = set(FALLBACKS.get(bucket, ()))
+        on_topic = sum(c not in fallbacks for c in cands)
+        if on_topic < (k if self.min_on_topic is None else self.min_on_topic) or cands[0] in fallbacks:
+            return GENERATE
+        return COMPOSE
+
+    def config(self) -> dict:
+        return {"enabled": self.enabled, "min_confidence": self.min_confidence, "buckets": sorted(self.buckets),
+                "min_on_topic": self.min_on_topic, "max_words": self.max_words}
+
+class RouteStats:
+    """Per-route counts, latency windows and (for generate) how often the output was discarded."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._lat = {COMPOSE: deque(maxlen=window), GENERATE: deque(maxlen=window)}
+        self._counts = {COMPOSE: 0, GENERATE: 0}
+        self._fallbacks = 0
+
+    def record(self, route: str, seconds: float, fell_back: bool = False):
+        with self._lock:
+            self._counts[route] += 1
+            self._lat[route].append(seconds)
+            if fell_back:
+                self._fallbacks += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for route, lat in self._lat.items():
+                lat = list(lat)
+                out[route] = {
+                    "n": self._counts[route],
+                    "p50_ms": round(percentile(lat, 50) * 1000, 1) if lat else None,
+                    "p99_ms": round(percentile(lat, 99) * 1000, 1) if lat else None,
+                }
+            n_gen = self._counts[GENERATE]
+            out[GENERATE]["fallbacks"] = self._fallbacks
+            out[GENERATE]["fallback_rate"] = round(self._fallbacks / n_gen, 4) if n_gen else None
+            total = n_gen + self._counts[COMPOSE]
+            out["compose_share"] = round(self._counts[COMPOSE] / total, 4) if total else None
+        return out
+
+    def reset(self):
+        with self._lock:
+            for d in self._lat.values(): d.clear()
+            self._counts = {COMPOSE: 0, GENERATE: 0}
+            self._fallbacks = 0
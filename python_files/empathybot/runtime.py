@@ -0,0 +1,449 @@
+"""
+Lazily initialized serving runtime.
+
+Nothing heavy happens at import: the detector, retriever and generator are
+created on first use (or all at once via init()) and shared process-wide.
+Detection, retrieval and generation results go through the stage caches in
+CACHES (see configure_caches(); EMPATHYBOT_CACHE_DB adds an on-disk tier).
+Passing session_id= keeps a small per-session memory in MEMORY (see memory.py;
+EMPATHYBOT_MEMORY_DB shares it through SQLite). Stage timings, fallbacks,
+overrides and model load times go to the metrics registry (metrics.py).
+"""
+import os, threading, time
+
+from .cache import LRUCache, SQLiteStore
+from .detector import heuristic_emotion_override, to_4_bucket_with_threshold
+from .generator import DISCLAIMER, compose_from_templates, is_weak_reply, postprocess
+from .memory import ConversationMemory, InProcessStore, SQLiteSessionStore, template_id
+from .metrics import (
+    EVENTS, FALLBACK_TEMPLATES, MODEL_LOAD_SECONDS, OVERRIDES, REGISTRY, REQUESTS, STAGE_SECONDS,
+)
+from .retriever import FALLBACKS
+from .routing import COMPOSE, GENERATE, RouteStats, RoutingPolicy
+from .safety import CRISIS_REPLY, screen_message
+from .text import clean_text
+
+_lock = threading.RLock()
+_detector = None
+_retriever = None
+_generator = None
+
+# Stage caches: detector results by cleaned text, retrieval by (text, bucket, k),
+# raw generations by full prompt. Versions follow the loaded components.
+CACHES: dict[str, LRUCache] = {}
+_SETTINGS: dict[str, dict] = {}   # last configure_caches() / configure_memory() arguments, for after_fork()
+
+def _sync_cache_versions():
+    if _detector is not None and "detect" in CACHES:
+        CACHES["detect"].set_version(_detector.version)
+    if _retriever is not None and "retrieve" in CACHES:
+        CACHES["retrieve"].set_version(_retriever.fingerprint)
+    if _generator is not None and "generate" in CACHES:
+        CACHES["generate"].set_version(_generator.version)
+
+def configure_caches(*, detect_size: int = 4096, retrieve_size: int = 4096, generate_size: int = 2048,
+                     ttl: float | None = 3600.0, disk_path: str | None = None):
+    """(Re)create the stage caches; size 0 disables a stage, disk_path adds a shared SQLite tier."""
+    _SETTINGS["caches"] = dict(detect_size=detect_size, retrieve_size=retrieve_size, generate_size=generate_size,
+                               ttl=ttl, disk_path=disk_path)
+    store = SQLiteStore(disk_path) if disk_path else None
+    CACHES["detect"] = LRUCache("detect", detect_size, ttl, store)
+    CACHES["retrieve"] = LRUCache("retrieve", retrieve_size, ttl, store)
+    CACHES["generate"] = LRUCache("generate", generate_size, ttl, store)
+    _sync_cache_versions()
+
+def cache_stats() -> dict:
+    out = {name: c.stats() for name, c in CACHES.items()}
+    emb = getattr(_retriever, "emb", None)
+    if hasattr(emb, "stats"):
+        out["embed"] = emb.stats()   # query embedding LRU (embeddings.py)
+    return out
+
+configure_caches(disk_path=os.environ.get("EMPATHYBOT_CACHE_DB") or None)
+
+# Generate-vs-compose routing (see routing.py)
+ROUTER = RoutingPolicy(enabled=os.environ.get("EMPATHYBOT_ROUTING", "on").lower() not in ("0", "off", "false"))
+ROUTE_STATS = RouteStats()
+
+def configure_routing(**kwargs):
+    """Replace the routing policy, e.g. configure_routing(min_confidence=0.9) or (enabled=False)."""
+    global ROUTER
+    ROUTER = RoutingPolicy(**{**ROUTER.config(), **kwargs})
+    ROUTE_STATS.reset()
+
+def route_stats() -> dict:
+    return {"policy": ROUTER.config(), **ROUTE_STATS.stats()}
+
+# Conversation memory (see memory.py): bounded per session, in-process LRU or SQLite
+MEMORY: ConversationMemory
+
+def configure_memory(*, max_turns: int = 8, max_bytes: int = 2048, max_sessions: int = 10_000,
+                     ttl: float | None = 6 * 3600, disk_path: str | None = None):
+    """(Re)create the session store; disk_path puts sessions in SQLite (shared by server processes)."""
+    global MEMORY
+    _SETTINGS["memory"] = dict(max_turns=max_turns, max_bytes=max_bytes, max_sessions=max_sessions,
+                               ttl=ttl, disk_path=disk_path)
+    store = SQLiteSessionStore(disk_path, ttl, max_sessions) if disk_path else InProcessStore(max_sessions, ttl)
+    MEMORY = ConversationMemory(store, max_turns=max_turns, max_bytes=max_bytes)
+
+def memory_stats() -> dict:
+    return MEMORY.stats()
+
+def forget_session(session_id: str):
+    MEMORY.forget(session_id)
+
+configure_memory(disk_path=os.environ.get("EMPATHYBOT_MEMORY_DB") or None)
+
+@REGISTRY.collector
+def _collect_runtime():
+    caches = list(cache_stats().items())
+    yield ("empathybot_cache_lookups_total", "counter", "Stage cache lookups by result.",
+           [({"cache": name, "result": r}, st[r]) for name, st in caches for r in ("hits", "disk_hits", "misses")])
+    yield ("empathybot_cache_entries", "gauge", "Entries held in memory per stage cache.",
+           [({"cache": name}, st["size"]) for name, st in caches])
+    yield ("empathybot_sessions", "gauge", "Conversation sessions in the memory store.",
+           [({}, len(MEMORY.store))])
+
+def _load(component: str, factory):
+    t0 = time.perf_counter()
+    obj = factory()
+    MODEL_LOAD_SECONDS.set(component, value=time.perf_counter() - t0)
+    return obj
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                from .detector import load_detector
+                _detector = _load("detector", load_detector)
+                _sync_cache_versions()
+    return _detector
+
+def get_retriever():
+    global _retriever
+    if _retriever is None:
+        with _lock:
+            if _retriever is None:
+                from .retriever import TemplateRetriever
+                _retriever = _load("retriever", TemplateRetriever)
+                _sync_cache_versions()
+    return _retriever
+
+def get_generator():
+    global _generator
+    if _generator is None:
+        with _lock:
+            if _generator is None:
+                from .generator import load_generator
+                _generator = _load("generator", load_generator)
+                _sync_cache_versions()
+    return _generator
+
+def init(*, detector: bool = True, retriever: bool = True, generator: bool = True):
+    """Eagerly load components (e.g. at server start so the first request isn't slow)."""
+    if detector: get_detector()
+    if retriever: get_retriever()
+    if generator: get_generator()
+
+def reload_retriever(force: bool = False) -> bool:
+    """Swap in a newer template index generation (ingest.py) if one is on disk; True if swapped."""
+    if _retriever is None or not hasattr(_retriever, "reload"):
+        return False
+    if not _retriever.reload(force):
+        return False
+    _sync_cache_versions()   # cached retrievals belong to the previous generation
+    return True
+
+def watch_index(interval: float = 5.0) -> threading.Thread:
+    """Poll for new index generations every `interval` seconds on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_retriever()
+            except Exception as e:   # keep serving the current generation
+                print("Index reload failed:", e)
+    t = threading.Thread(target=loop, name="empathybot-index-watch", daemon=True)
+    t.start()
+    return t
+
+def after_fork():
+    """
+    In a freshly forked worker (hosting.prefork): new stage caches and session
+    store (SQLite connections must not cross fork), and per-process resources
+    of the loaded components (ONNX sessions, embedding worker connections).
+    The model weights themselves stay shared with the parent.
+    """
+    configure_caches(**_SETTINGS["caches"])
+    configure_memory(**_SETTINGS["memory"])
+    ROUTE_STATS.reset()
+    for component in (_detector, _retriever, _generator):
+        if hasattr(component, "after_fork"):
+            component.after_fork()
+
+def detect_emotion_label_and_conf(text: str):
+    det = get_detector()
+    with STAGE_SECONDS.time("detect"):
+        return CACHES["detect"].get_or_compute(clean_text(text), lambda: det.detect(text))
+
+def retrieve_top3(user_text: str, target_emotion_4: str, k: int = 3):
+    ret = get_retriever()
+    with STAGE_SECONDS.time("retrieve"):
+        hit = CACHES["retrieve"].get_or_compute(
+            (user_text, target_emotion_4, k), lambda: ret.retrieve_top3(user_text, target_emotion_4, k=k))
+    return list(hit)
+
+def _session_cands(user_message: str, bucket: str, k: int, state) -> list[str]:
+    """k templates for a session turn, preferring ones not used in its recent turns."""
+    recent = state.recent_template_ids() if state is not None else set()
+    if not recent:
+        return retrieve_top3(user_message, bucket, k=k)
+    hits = retrieve_top3(user_message, bucket, k=k + len(recent))
+    fresh = [c for c in hits if template_id(c) not in recent]
+    return (fresh + [c for c in hits if template_id(c) in recent])[:k]
+
+def _context(state) -> str | None:
+    return state.summary() if state is not None and state.turns else None
+
+def _gen_key(prompt: str, decoding: str | None):
+    return prompt if decoding is None else (prompt, decoding)
+
+def generate(prompt: str, decoding: str | None = None) -> str:
+    """Generate for a full prompt; decoding: None (backend default), "beam" or "greedy"."""
+    gen = get_generator()
+    with STAGE_SECONDS.time("generate"):
+        return CACHES["generate"].get_or_compute(_gen_key(prompt, decoding),
+                                                 lambda: gen.generate(prompt, decoding=decoding))
+
+_MISS = object()
+
+def _cached_many(cache: LRUCache, keys: list, compute_many) -> list:
+    """Look up every key; compute_many(missing_positions) fills the misses in one batch."""
+    version = cache.version
+    vals = [cache.get(key, _MISS) for key in keys]
+    missing = [i for i, v in enumerate(vals) if v is _MISS]
+    if missing:
+        for i, v in zip(missing, compute_many(missing)):
+            vals[i] = v
+            cache.put(keys[i], v, version)
+    return vals
+
+def _bucket_for(user_message: str, raw_label: str, conf: float) -> tuple[str, str]:
+    label = heuristic_emotion_override(user_message, raw_label)
+    if label != raw_label:
+        OVERRIDES.inc(raw_label, label)
+    return label, to_4_bucket_with_threshold(label, conf, thr=0.50)
+
+def _with_fallbacks(cands: list[str], bucket: str, k: int) -> list[str]:
+    """FALLBACKS when retrieval found nothing; counts that, partial top-ups and fallback templates served."""
+    if not cands:
+        EVENTS.inc("retrieve_empty")
+        cands = FALLBACKS[bucket][:k]
+        FALLBACK_TEMPLATES.inc(bucket, amount=len(cands))
+        return cands
+    fallbacks = set(FALLBACKS.get(bucket, ()))
+    n = sum(c in fallbacks for c in cands)
+    if n:
+        EVENTS.inc("retrieve_topped_up")
+        FALLBACK_TEMPLATES.inc(bucket, amount=n)
+    return cands
+
+def _record_route(route: str, seconds: float, fell_back: bool = False, n: int = 1):
+    ROUTE_STATS.record(route, seconds, fell_back)
+    REQUESTS.inc(route, amount=n)
+    STAGE_SECONDS.observe("respond", value=seconds, count=n)
+
+def _result(raw_label: str, conf: float, bucket: str, cands: list[str], final: str, route: str, fallback: bool):
+    return {
+        "detected_emotion": raw_label,
+        "confidence": round(conf, 3),
+        "bucket": bucket,
+        "templates": cands,
+        "reply": f"{final}\n\n{DISCLAIMER}",
+        "route": route,
+        "fallback": fallback,
+    }
+
+def _compose(raw_label: str, conf: float, bucket: str, cands: list[str]):
+    """Fast path: reply composed from the templates, generator never called."""
+    return _result(raw_label, conf, bucket, cands, compose_from_templates(bucket, cands), COMPOSE, False)
+
+def _finalize(user_message: str, raw_label: str, conf: float, bucket: str, cands: list[str], raw: str):
+    # 4) post-process; if weak/empty/echo, synthesize from templates
+    with STAGE_SECONDS.time("postprocess"):
+        final = postprocess(raw, user_message)
+        fallback = is_weak_reply(final, user_message)
+        if fallback:
+            EVENTS.inc("compose_replaced_generation")
+            final = compose_from_templates(bucket, cands)
+    return _result(raw_label, conf, bucket, cands, final, GENERATE, fallback)
+
+def _screened(category: str) -> dict:
+    """Reply for a message stopped by the safety screen; no model is run."""
+    REQUESTS.inc("safety")
+    EVENTS.inc(f"screened_{category}")
+    return {
+        "detected_emotion": category,
+        "confidence": 1.0,
+        "bucket": "sadness",
+        "templates": [],
+        "reply": f"{CRISIS_REPLY}\n\n{DISCLAIMER}",
+        "route": "safety",
+        "fallback": False,
+        "safety": category,
+    }
+
+def respond(
+    user_message: str,
+    *,
+    force_emotion: str | None = None,
+    k: int = 3,
+    decoding: str | None = None,
+    session_id: str | None = None
+):
+    state = MEMORY.load(session_id) if session_id else None
+    out = _respond(user_message, force_emotion, k, decoding, state)
+    if session_id:
+        MEMORY.record(session_id, state, user_message, out)
+    return out
+
+def _respond(user_message: str, force_emotion: str | None, k: int, decoding: str | None, state):
+    # 0) crisis messages get the safety reply before any model runs
+    flag = screen_message(user_message)
+    if flag:
+        return _screened(flag)
+    t0 = time.perf_counter()
+
+    # 1) detect with confidence & heuristic override
+    if force_emotion:
+        raw_label, conf = force_emotion, 1.0
+        bucket = to_4_bucket_with_threshold(raw_label, conf, thr=0.50)
+    else:
+        raw_label, conf = detect_emotion_label_and_conf(user_message)
+        raw_label, bucket = _bucket_for(user_message, raw_label, conf)
+
+    # 2) retrieve k templates (on-topic + emotion), skipping ones this session just saw
+    cands = _with_fallbacks(_session_cands(user_message, bucket, k, state), bucket, k)
+
+    # 3) compose directly when the policy says generation would not beat the templates
+    if ROUTER.route(user_message, conf, bucket, cands, k) == COMPOSE:
+        out = _compose(raw_label, conf, bucket, cands)
+    else:
+        # 3') generate with few-shot (use .invoke)
+        with STAGE_SECONDS.time("prompt"):
+            prompt = get_generator().build_prompt(user_message, bucket, cands, context=_context(state))
+        raw = generate(prompt, decoding=decoding)
+        out = _finalize(user_message, raw_label, conf, bucket, cands, raw)
+
+    _record_route(out["route"], time.perf_counter() - t0, out["fallback"])
+    return out
+
+def respond_many(
+    user_messages: list[str],
+    *,
+    batch_size: int = 16,
+    force_emotion: str | None = None,
+    k: int = 3,
+    decoding: str | None = None,
+    session_ids: list[str | None] | None = None
+) -> list[dict]:
+    """
+    respond() for many messages (offline replay / evaluation).
+
+    Each chunk of `batch_size` messages gets one detector forward pass, one
+    index search per emotion bucket and one padded generation batch (for the
+    messages the routing policy sends to the generator); the results are the
+    same dicts respond() returns, in input order. session_ids (one per message,
+    None for stateless ones) are read once up front; turns are recorded in input
+    order after each chunk, so a session that comes back in a later chunk sees
+    its earlier turns (messages of one session within the same chunk share the
+    state from before that chunk).
+    """
+    results: list[dict | None] = [None] * len(user_messages)
+    sessions = session_ids or [None] * len(user_messages)
+    loaded = {sid: MEMORY.load(sid) for sid in set(sessions) if sid}   # one state per session, even if repeated
+    states = [loaded.get(sid) for sid in sessions]
+    recorded = 0   # results[:recorded] are in MEMORY
+
+    def record_until(end: int):
+        nonlocal recorded
+        for pos in range(recorded, end):
+            if sessions[pos]:
+                MEMORY.record(sessions[pos], states[pos], user_messages[pos], results[pos])
+        recorded = max(recorded, end)
+
+    todo = []
+    for i, m in enumerate(user_messages):
+        flag = screen_message(m)
+        if flag:
+            results[i] = _screened(flag)
+        else:
+            todo.append(i)
+
+    for start in range(0, len(todo), batch_size):
+        positions = todo[start:start + batch_size]
+        chunk = [user_messages[i] for i in positions]
+        t0 = time.perf_counter()
+
+        # 1) detect
+        if force_emotion:
+            conf = 1.0
+            labels = [(force_emotion, to_4_bucket_with_threshold(force_emotion, conf, thr=0.50))] * len(chunk)
+            confs = [conf] * len(chunk)
+        else:
+            det = get_detector()
+            detected = _cached_many(CACHES["detect"], [clean_text(m) for m in chunk],
+                                    lambda idx: det.detect_many([chunk[i] for i in idx], batch_size=batch_size))
+            STAGE_SECONDS.observe("detect", value=(time.perf_counter() - t0) / len(chunk), count=len(chunk))
+            confs = [c for _, c in detected]
+            labels = [_bucket_for(m, lbl, c) for m, (lbl, c) in zip(chunk, detected)]
+        buckets = [b for _, b in labels]
+
+        # 2) retrieve
+        ret = get_retriever()
+        chunk_states = [states[i] for i in positions]
+        plain = [i for i, st in enumerate(chunk_states) if st is None or not st.recent_template_ids()]
+        t1 = time.perf_counter()
+        found = _cached_many(CACHES["retrieve"], [(chunk[i], buckets[i], k) for i in plain],
+                             lambda idx: ret.retrieve_many([chunk[plain[i]] for i in idx],
+                                                           [buckets[plain[i]] for i in idx], k=k))
+        if plain:
+            STAGE_SECONDS.observe("retrieve", value=(time.perf_counter() - t1) / len(plain), count=len(plain))
+        found = dict(zip(plain, found))
+        cands_all = [list(found[i]) if i in found else _session_cands(m, b, k, st)
+                     for i, (m, b, st) in enumerate(zip(chunk, buckets, chunk_states))]
+        cands_all = [_with_fallbacks(c, b, k) for c, b in zip(cands_all, buckets)]
+
+        # 3) route; generate only for the messages that need it
+        routes = [ROUTER.route(m, c, b, cands, k) for m, c, b, cands in zip(chunk, confs, buckets, cands_all)]
+        gen_idx = [i for i, r in enumerate(routes) if r == GENERATE]
+        t_shared = (time.perf_counter() - t0) / len(chunk)
+        raws = {}
+        t_gen = 0.0
+        if gen_idx:
+            t1 = time.perf_counter()
+            gen = get_generator()
+            prompts = [gen.build_prompt(chunk[i], buckets[i], cands_all[i], context=_context(chunk_states[i]))
+                       for i in gen_idx]
+            t2 = time.perf_counter()
+            outs = _cached_many(CACHES["generate"], [_gen_key(p, decoding) for p in prompts],
+                                lambda idx: gen.generate_many([prompts[i] for i in idx], batch_size=batch_size,
+                                                              decoding=decoding))
+            raws = dict(zip(gen_idx, outs))
+            t_gen = (time.perf_counter() - t1) / len(gen_idx)
+            STAGE_SECONDS.observe("prompt", value=(t2 - t1) / len(gen_idx), count=len(gen_idx))
+            STAGE_SECONDS.observe("generate", value=(time.perf_counter() - t2) / len(gen_idx), count=len(gen_idx))
+
+        for i, (pos, m, (lbl, b), conf, cands) in enumerate(zip(positions, chunk, labels, confs, cands_all)):
+            if i in raws:
+                out = _finalize(m, lbl, conf, b, cands, raws[i])
+                _record_route(GENERATE, t_shared + t_gen, out["fallback"])
+            else:
+                out = _compose(lbl, conf, b, cands)
+                _record_route(COMPOSE, t_shared)
+            results[pos] = out
+        record_until(positions[-1] + 1)
+
+    record_until(len(user_messages))
+    return results
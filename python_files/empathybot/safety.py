@@ -0,0 +1,70 @@
+"""
+Compiled pattern matching for safety flags and meta-line stripping.
+
+Each PatternSet compiles its categories once into a single alternation
+(`(?P<crisis>…)|(?P<profanity>…)`), so "does anything match?" costs one regex
+scan instead of one re.search per pattern. Patterns are written for lowercase
+text; inputs are lowercased before matching, exactly as the old loops did.
+
+    SAFETY.first("I want to end my life")      → "crisis"
+    SAFETY.categories("...")                   → {"crisis", "profanity"}
+    screen_message(user_text)                  → "crisis" | None  (SCREEN; used by respond())
+"""
+import re
+
+from .text import clean_text
+
+CRISIS_PATTERNS = [
+    r"\bsuicid(e|al)\b", r"\bkill myself\b", r"\bend my life\b",
+    r"\bself[- ]?harm\b", r"\boverdose\b", r"\bcutting\b"
+]
+PROFANITY = [r"\b(fuck|shit|bitch|asshole|bastard)\b"]
+
+# Generated lines that leak the prompt scaffolding (dropped by postprocess())
+META_PATTERNS = [
+    r"\btemplates?\b", r"\bemotion:\b", r"\buser:\b",
+    r"\bguideline(s)?\b", r"\bdo not\b", r"\bparaphrase\b", r"\bcontext:"
+]
+
+class PatternSet:
+    def __init__(self, categories: dict[str, list[str]]):
+        self.patterns = {name: list(pats) for name, pats in categories.items()}
+        self.by_category = {name: re.compile("|".join(f"(?:{p})" for p in pats))
+                            for name, pats in self.patterns.items()}
+        self.combined = re.compile("|".join(f"(?P<{name}>{rx.pattern})" for name, rx in self.by_category.items()))
+
+    def first(self, text: str) -> str | None:
+        """Category of the leftmost match, or None."""
+        m = self.combined.search(text.lower())
+        return m.lastgroup if m else None
+
+    def matches(self, text: str) -> bool:
+        return self.combined.search(text.lower()) is not None
+
+    def categories(self, text: str) -> set[str]:
+        """Every category with at least one match (report / review use)."""
+        low = text.lower()
+        if not self.combined.search(low):
+            return set()
+        return {name for name, rx in self.by_category.items() if rx.search(low)}
+
+SAFETY = PatternSet({"crisis": CRISIS_PATTERNS, "profanity": PROFANITY})
+META = PatternSet({"meta": META_PATTERNS})
+
+# Live user input short-circuits respond() before any model runs, so a false positive
+# replaces a normal reply: bare "cutting" (grass, people off…) only flags corpus rows for review.
+SCREEN = PatternSet({"crisis": [p for p in CRISIS_PATTERNS if p != r"\bcutting\b"]
+                               + [r"\bcut(ting)? myself\b"]})
+SCREEN_CATEGORIES = ("crisis",)
+
+CRISIS_REPLY = ("I’m really sorry you’re going through something this painful, and I’m glad you said it. "
+                "You don’t have to handle it alone—please reach out right now to someone you trust, "
+                "a local crisis line, or emergency services.")
+
+def screen_message(user_text: str, categories=SCREEN_CATEGORIES) -> str | None:
+    """The screened category a user message falls into, else None."""
+    cats = SCREEN.categories(clean_text(user_text))
+    for c in categories:
+        if c in cats:
+            return c
+    return None
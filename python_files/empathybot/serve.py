@@ -0,0 +1,318 @@
+"""
+Asyncio HTTP service with dynamic micro-batching in front of respond().
+
+    python -m empathybot.serve --port 8000 --max-batch 16 --max-wait-ms 10
+    python -m empathybot.serve --port 8000 --workers 4    # models loaded once, shared by 4 forked workers
+
+    POST /respond   {"message": "...", "force_emotion": null, "k": 3, "decoding": null, "session_id": null}   (k: 1..MAX_K)
+                    → respond() dict
+    GET  /health    → {"ok": true}
+    GET  /stats     → queue depth, batch sizes, p50/p99 latency, cache hit rates, per-route stats,
+                      answering worker's pid and RSS / shared / private memory
+    GET  /metrics   → Prometheus text format (stage histograms, fallbacks, overrides, model loads, queue)
+    GET  /debug/profile?seconds=5   → collapsed stacks from a sampling profiler (only with --profiling; 0 < seconds ≤ 60)
+    POST /admin/reload  → swap to the newest template index generation now (ingest.py)
+
+Requests arriving within `max_wait_ms` of each other (up to `max_batch`) are
+answered by one respond_many() call, i.e. one detector forward pass and one
+generation batch. A full queue answers 503 (backpressure); a request that
+waits longer than `timeout` answers 504.
+
+With --workers N the models are loaded once and N worker processes are forked
+from the loaded master (hosting.prefork), all accepting on the same socket;
+weights are shared copy-on-write, each worker has its own batcher and caches.
+
+Every `--watch-index` seconds each process checks the index directory for a
+new generation written by `python -m empathybot.ingest` and swaps to it;
+requests already retrieving finish on the generation they started with.
+"""
+import argparse, asyncio, json, os, socket, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import runtime
+from .hosting import prefork, process_memory
+from .metrics import REGISTRY, profile
+from .retriever import BUCKET_FETCH
+from .util import QueueFull, percentile
+
+REQUEST_SECONDS = REGISTRY.histogram("empathybot_request_seconds", "POST /respond latency including queueing.")
+
+class MicroBatcher:
+    """Collects submitted messages into batches and runs them on one model thread."""
+
+    def __init__(self, max_batch: int = 16, max_wait_ms: float = 10.0, max_queue: int = 256,
+                 respond_many=None, window: int = 2048):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.respond_many = respond_many or runtime.respond_many
+        # one thread: the models are shared and not re-entrant
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="empathybot-model")
+        self.latencies = deque(maxlen=window)   # seconds, end-to-end per request
+        self.batch_sizes = deque(maxlen=window)
+        self.counts = {"ok": 0, "rejected": 0, "timeout": 0, "error": 0}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, message: str, *, force_emotion: str | None = None, k: int = 3,
+                     decoding: str | None = None, session_id: str | None = None,
+                     timeout: float | None = None) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        t0 = time.perf_counter()
+        try:
+            self.queue.put_nowait((message, force_emotion, k, decoding, session_id, fut))
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            raise QueueFull()
+        try:
+            res = await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeout"] += 1
+            raise
+        self.latencies.append(time.perf_counter() - t0)
+        REQUEST_SECONDS.observe(value=time.perf_counter() - t0)
+        self.counts["ok"] += 1
+        return res
+
+    async def _collect(self) -> list:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            left = deadline - asyncio.get_running_loop().time()
+            if left <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), left))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [b for b in batch if not b[-1].done()]   # drop requests that already timed out
+            if not batch:
+                continue
+            self.batch_sizes.append(len(batch))
+            # respond_many takes one force_emotion/k/decoding per call → group on those
+            groups: dict[tuple, list] = {}
+            for item in batch:
+                groups.setdefault(item[1:4], []).append(item)
+            for (force_emotion, k, decoding), items in groups.items():
+                msgs = [it[0] for it in items]
+                sids = [it[4] for it in items]
+                try:
+                    outs = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.respond_many(msgs, batch_size=len(msgs), force_emotion=force_emotion,
+                                                  k=k, decoding=decoding, session_ids=sids))
+                except Exception as e:
+                    self.counts["error"] += len(items)
+                    for it in items:
+                        if not it[-1].done(): it[-1].set_exception(e)
+                    continue
+                for it, out in zip(items, outs):
+                    if not it[-1].done(): it[-1].set_result(out)
+
+    def metric_families(self):
+        """REGISTRY collector: queue depth, request outcomes and batch count."""
+        yield "empathybot_queue_depth", "gauge", "Requests waiting for a batch.", [({}, self.queue.qsize())]
+        yield ("empathybot_http_requests_total", "counter", "POST /respond outcomes.",
+               [({"outcome": k}, v) for k, v in self.counts.items()])
+        yield "empathybot_batches_total", "counter", "respond_many() batches run.", [({}, len(self.batch_sizes))]
+
+    def stats(self) -> dict:
+        lat = list(self.latencies)
+        sizes = list(self.batch_sizes)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "counts": dict(self.counts),
+            "batches": len(sizes),
+            "mean_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "latency_ms": {
+                "p50": round(percentile(lat, 50) * 1000, 1) if lat else None,
+                "p99": round(percentile(lat, 99) * 1000, 1) if lat else None,
+                "n": len(lat),
+            },
+        }
+
+# ---------- minimal HTTP/1.1 (no extra dependency) ----------
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+MAX_BODY = 64 * 1024
+MAX_K = BUCKET_FETCH   # templates per reply; retrieval fetches BUCKET_FETCH × k per bucket
+MAX_PROFILE_SECONDS = 60.0
+
+def _http_response(status: int, payload: dict | str, keep_alive: bool) -> bytes:
+    if isinstance(payload, str):   # /metrics, /debug/profile
+        body, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, ctype = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+class EmpathyServer:
+    def __init__(self, batcher: MicroBatcher, timeout: float = 30.0, profiling: bool = False):
+        self.batcher = batcher
+        self.timeout = timeout
+        self.profiling = profiling
+
+    async def route(self, method: str, path: str, body: bytes, query: str = "") -> tuple[int, dict | str]:
+        if method == "GET" and path == "/health":
+            return 200, {"ok": True}
+        if method == "GET" and path == "/metrics":
+            return 200, REGISTRY.render()
+        if method == "GET" and path == "/debug/profile" and self.profiling:
+            params = dict(kv.split("=", 1) for kv in query.split("&") if "=" in kv)
+            try:
+                seconds = float(params.get("seconds", 5))
+            except ValueError:
+                seconds = float("nan")
+            if not 0 < seconds <= MAX_PROFILE_SECONDS:
+                return 400, {"error": f"seconds must be a number in (0, {MAX_PROFILE_SECONDS:g}]"}
+            return 200, await asyncio.get_running_loop().run_in_executor(None, profile, seconds)
+        if method == "GET" and path == "/stats":
+            return 200, {**self.batcher.stats(), "caches": runtime.cache_stats(), "routes": runtime.route_stats(),
+                         "sessions": runtime.memory_stats(), "pid": os.getpid(), "memory": process_memory()}
+        if method == "POST" and path == "/admin/reload":
+            swapped = await asyncio.get_running_loop().run_in_executor(None, runtime.reload_retriever, True)
+            ret = runtime.get_retriever()
+            return 200, {"reloaded": swapped, "generation": getattr(ret.index, "generation", None),
+                         "fingerprint": ret.fingerprint}
+        if method == "POST" and path == "/respond":
+            try:
+                req = json.loads(body or b"{}")
+                message = req["message"]
+                if not isinstance(message, str) or not message.strip():
+                    raise ValueError("message must be a non-empty string")
+                if req.get("decoding") not in (None, "beam", "greedy"):
+                    raise ValueError("decoding must be 'beam' or 'greedy'")
+                if not isinstance(req.get("session_id"), (str, type(None))):
+                    raise ValueError("session_id must be a string")
+                if not isinstance(req.get("force_emotion"), (str, type(None))):
+                    raise ValueError("force_emotion must be a string")
+                k = req.get("k", 3)
+                if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+                    raise ValueError(f"k must be an integer from 1 to {MAX_K}")
+                timeout = float(req.get("timeout", self.timeout))
+                if not 0 < timeout < float("inf"):
+                    raise ValueError("timeout must be a positive number of seconds")
+            except (ValueError, KeyError, TypeError, OverflowError) as e:
+                return 400, {"error": f"bad request: {e}"}
+            try:
+                out = await self.batcher.submit(
+                    message, force_emotion=req.get("force_emotion") or None, k=k,
+                    decoding=req.get("decoding"), session_id=req.get("session_id") or None,
+                    timeout=timeout)
+            except QueueFull:
+                return 503, {"error": "server busy, retry later"}
+            except asyncio.TimeoutError:
+                return 504, {"error": "timed out"}
+            except Exception as e:
+                return 500, {"error": str(e)}
+            return 200, out
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(_http_response(400, {"error": "bad request line"}, False))
+                    break
+                headers = {}
+                for ln in lines[1:]:
+                    if ":" in ln:
+                        name, val = ln.split(":", 1)
+                        headers[name.strip().lower()] = val.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    writer.write(_http_response(400, {"error": "bad content-length"}, False))
+                    break
+                if length > MAX_BODY:
+                    writer.write(_http_response(413, {"error": "body too large"}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                path, _, query = target.partition("?")
+                status, payload = await self.route(method.upper(), path, body, query)
+                writer.write(_http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+async def serve(host: str = "0.0.0.0", port: int = 8000, *, max_batch: int = 16, max_wait_ms: float = 10.0,
+                max_queue: int = 256, timeout: float = 30.0, warmup: bool = True, profiling: bool = False,
+                sock: socket.socket | None = None, watch_index: float = 5.0):
+    batcher = MicroBatcher(max_batch=max_batch, max_wait_ms=max_wait_ms, max_queue=max_queue)
+    REGISTRY.collector(batcher.metric_families)
+    if warmup:
+        print("Loading models…")
+        await asyncio.get_running_loop().run_in_executor(batcher.executor, runtime.init)
+    batcher.start()
+    if watch_index > 0:
+        runtime.watch_index(watch_index)
+    app = EmpathyServer(batcher, timeout=timeout, profiling=profiling)
+    if sock is not None:   # pre-forked worker: the master's listening socket
+        server = await asyncio.start_server(app.handle, sock=sock)
+    else:
+        server = await asyncio.start_server(app.handle, host, port)
+    print(f"EmpathyBot serving on http://{host}:{port} (pid={os.getpid()}, max_batch={max_batch}, "
+          f"max_wait_ms={max_wait_ms})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m empathybot.serve", description="Micro-batching EmpathyBot HTTP server")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--max-batch", type=int, default=16, help="max requests per model batch")
+    ap.add_argument("--max-wait-ms", type=float, default=10.0, help="how long to wait to fill a batch")
+    ap.add_argument("--max-queue", type=int, default=256, help="queued requests before answering 503")
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    ap.add_argument("--no-warmup", action="store_true", help="load models on first request instead of at start")
+    ap.add_argument("--profiling", action="store_true", help="enable GET /debug/profile (sampling profiler)")
+    ap.add_argument("--workers", type=int, default=1, help="forked worker processes sharing one copy of the models")
+    ap.add_argument("--watch-index", type=float, default=5.0,
+                    help="seconds between checks for a new template index generation (0: never)")
+    ap.add_argument("--threads-per-worker", type=int, default=None, help="torch threads per worker (default: cpus / workers)")
+    args = ap.parse_args(argv)
+    opts = dict(max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue,
+                timeout=args.timeout, profiling=args.profiling, watch_index=args.watch_index)
+    if args.workers <= 1:
+        asyncio.run(serve(args.host, args.port, warmup=not args.no_warmup, **opts))
+        return
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.setblocking(False)
+    prefork(args.workers, lambda: asyncio.run(serve(args.host, args.port, warmup=False, sock=sock, **opts)),
+            threads_per_worker=args.threads_per_worker)
+
+if __name__ == "__main__":
+    main()
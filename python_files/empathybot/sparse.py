@@ -0,0 +1,79 @@
+"""
+BM25 over the templates' precomputed keyword sets + reciprocal rank fusion.
+
+    bm25 = BM25Index(table.keywords, index.partition_rows())
+    rows = bm25.search(keyword_set(user_text), k=12, emotion="sadness")   # global row ids, best first
+    fused = rrf([dense_rows, rows])
+
+Keyword sets are binary (each term counts once per template), so a posting's
+BM25 weight idf · (k1 + 1) / (1 + k1 · (1 - b + b · len / avglen)) is fixed
+at build time and a query is a sum of posting arrays. Postings are split per
+emotion (the live global row ids of each bucket, possibly spread over several
+index segments), with idf computed inside the bucket, so a bucket-restricted
+search never touches other buckets' rows.
+"""
+import math
+
+import numpy as np
+
+from .index import topk_rows
+
+RRF_K = 60   # the usual constant from Cormack et al.; damps the head of each ranking
+
+class BM25Index:
+    def __init__(self, keywords: list[frozenset], partitions: dict[str, np.ndarray],
+                 k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        # emotion -> global row ids (local position i ↔ rows[i]); None searches every bucket
+        self.rows: dict[str | None, np.ndarray] = {emo: np.asarray(r, dtype=np.int64) for emo, r in partitions.items()}
+        self.rows[None] = np.sort(np.concatenate(list(self.rows.values()))) if partitions \
+            else np.arange(len(keywords), dtype=np.int64)
+        # emotion -> term -> (local rows int32, weights float32)
+        self.postings: dict[str | None, dict[str, tuple[np.ndarray, np.ndarray]]] = {
+            emo: self._build([keywords[r] for r in rows]) for emo, rows in self.rows.items()}
+
+    def _build(self, keywords: list[frozenset]) -> dict:
+        n = len(keywords)
+        lengths = np.array([len(kws) for kws in keywords], dtype=np.float32)
+        avg = float(lengths.mean()) if n and lengths.sum() else 1.0
+        rows_by_term: dict[str, list[int]] = {}
+        for row, kws in enumerate(keywords):
+            for w in kws:
+                rows_by_term.setdefault(w, []).append(row)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg)
+        out = {}
+        for w, rows in rows_by_term.items():
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            r = np.asarray(rows, dtype=np.int32)
+            out[w] = (r, (idf * (self.k1 + 1) / (1 + norm[r])).astype(np.float32))
+        return out
+
+    def scores(self, terms, emotion: str | None = None) -> np.ndarray | None:
+        """BM25 score of every row in the partition (local order); None for an unknown emotion."""
+        if emotion not in self.rows:
+            return None
+        postings = self.postings[emotion]
+        s = np.zeros(len(self.rows[emotion]), dtype=np.float32)
+        for w in terms:
+            hit = postings.get(w)
+            if hit is not None:
+                s[hit[0]] += hit[1]
+        return s
+
+    def search(self, terms, k: int, emotion: str | None = None) -> list[int]:
+        """Global row ids of the top-k rows with a non-zero score, best first."""
+        s = self.scores(terms, emotion)
+        if s is None:
+            return []
+        n = min(k, int(np.count_nonzero(s)))
+        if not n:
+            return []
+        return self.rows[emotion][topk_rows(s.reshape(1, -1), n)[0]].tolist()
+
+def rrf(rankings: list[list[int]], k: int = RRF_K) -> list[int]:
+    """Reciprocal rank fusion: rows ordered by Σ 1 / (k + rank) over the rankings they appear in."""
+    score: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            score[row] = score.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(score, key=lambda r: (-score[r], r))
@@ -0,0 +1,121 @@
+"""
+Streaming respond(): emotion/badge data first, then reply text as it is generated.
+
+    for ev in respond_stream("I'm really down today"):
+        if ev["type"] == "meta":  show_badge(ev)
+        elif ev["type"] == "delta": append(ev["text"])
+        elif ev["type"] == "final": replace_with(ev["reply"])
+
+The "final" event carries the same dict respond() returns; its reply is the
+authoritative text (it may differ from the streamed deltas when the output was
+weak and got replaced by compose_from_templates()).
+"""
+import asyncio, threading, time
+
+from .detector import to_4_bucket_with_threshold
+from .generator import IncrementalPostprocessor
+from .metrics import STAGE_SECONDS
+from . import runtime
+from .routing import COMPOSE
+from .runtime import (
+    _bucket_for, _compose, _context, _finalize, _record_route, _screened, _session_cands, _with_fallbacks,
+    detect_emotion_label_and_conf, get_generator,
+)
+from .safety import CRISIS_REPLY, screen_message
+
+def respond_stream(
+    user_message: str,
+    *,
+    force_emotion: str | None = None,
+    k: int = 3,
+    session_id: str | None = None
+):
+    state = runtime.MEMORY.load(session_id) if session_id else None
+    for ev in _stream(user_message, force_emotion, k, state):
+        if ev["type"] == "final" and session_id:
+            runtime.MEMORY.record(session_id, state, user_message, ev)
+        yield ev
+
+def _stream(user_message: str, force_emotion: str | None, k: int, state):
+    # 0) safety screen, as respond(): fixed reply, no model work
+    flag = screen_message(user_message)
+    if flag:
+        out = _screened(flag)
+        yield {"type": "meta", **{key: out[key] for key in ("detected_emotion", "confidence", "bucket", "templates")}}
+        yield {"type": "delta", "text": CRISIS_REPLY}
+        yield {"type": "final", **out}
+        return
+
+    # 1) detect + 2) retrieve, exactly as respond()
+    t0 = time.perf_counter()
+    if force_emotion:
+        raw_label, conf = force_emotion, 1.0
+        bucket = to_4_bucket_with_threshold(raw_label, conf, thr=0.50)
+    else:
+        raw_label, conf = detect_emotion_label_and_conf(user_message)
+        raw_label, bucket = _bucket_for(user_message, raw_label, conf)
+    cands = _with_fallbacks(_session_cands(user_message, bucket, k, state), bucket, k)
+
+    yield {"type": "meta", "detected_emotion": raw_label, "confidence": round(conf, 3),
+           "bucket": bucket, "templates": cands}
+
+    # composed reply (routing fast path): one delta, no generation
+    if runtime.ROUTER.route(user_message, conf, bucket, cands, k) == COMPOSE:
+        out = _compose(raw_label, conf, bucket, cands)
+        _record_route(COMPOSE, time.perf_counter() - t0)
+        yield {"type": "delta", "text": out["reply"].split("\n\n", 1)[0]}
+        yield {"type": "final", **out}
+        return
+
+    # 3) stream generation; stop as soon as two sentences are complete
+    gen = get_generator()
+    with STAGE_SECONDS.time("prompt"):
+        prompt = gen.build_prompt(user_message, bucket, cands, context=_context(state))
+    pp = IncrementalPostprocessor(user_message)
+    stop = threading.Event()
+    t_gen = time.perf_counter()
+    chunks = gen.stream(prompt, stop_event=stop)
+    try:
+        for chunk in chunks:
+            delta = pp.feed(chunk)
+            if delta:
+                yield {"type": "delta", "text": delta}
+            if pp.done:
+                stop.set()
+                break
+    finally:
+        chunks.close()
+    STAGE_SECONDS.observe("generate", value=time.perf_counter() - t_gen)
+    tail = pp.finish()
+    if tail:
+        yield {"type": "delta", "text": tail}
+
+    # 4) same post-processing / fallback as respond() on the full raw text
+    out = _finalize(user_message, raw_label, conf, bucket, cands, pp.raw.strip())
+    _record_route(out["route"], time.perf_counter() - t0, out["fallback"])
+    yield {"type": "final", **out}
+
+_DONE = object()
+
+async def arespond_stream(user_message: str, **kwargs):
+    """Async-iterator version of respond_stream(); the model work runs in a thread."""
+    loop = asyncio.get_running_loop()
+    q: asyncio.Queue = asyncio.Queue()
+
+    def pump():
+        try:
+            for ev in respond_stream(user_message, **kwargs):
+                loop.call_soon_threadsafe(q.put_nowait, ev)
+        except Exception as e:
+            loop.call_soon_threadsafe(q.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(q.put_nowait, _DONE)
+
+    threading.Thread(target=pump, daemon=True).start()
+    while True:
+        ev = await q.get()
+        if ev is _DONE:
+            return
+        if isinstance(ev, Exception):
+            raise ev
+        yield ev
@@ -0,0 +1,209 @@
+"""
+Speech-to-text service: in-memory audio decoding + a bounded Whisper worker pool.
+
+    stt = STTService(load_stt_backend("ct2", "base"), workers=2, max_queue=8)
+    text = stt.transcribe(wav_bytes, timeout=30)      # or stt.submit(...) → Future
+    stt.stats()    # queue depth, busy workers, p50/p99 of queue wait / decode / transcribe, real-time factor
+
+Recorder bytes are decoded straight into a 16 kHz mono float32 array (the input
+Whisper expects): PCM WAV with the stdlib `wave` reader, anything else through
+ffmpeg over pipes. Nothing is written to disk.
+
+Backends share one interface, transcribe(float32 array) -> str:
+    "whisper"   openai-whisper (torch; fp16 on GPU). One call at a time per model.
+    "ct2"       faster-whisper, int8 CTranslate2 on CPU; runs `workers` calls in parallel.
+EMPATHYBOT_STT_BACKEND / WHISPER_SIZE pick the default.
+"""
+import io, queue, subprocess, threading, time, wave
+from collections import deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+import numpy as np
+
+from .config import STT_BACKEND, WHISPER_SIZE
+from .util import QueueFull, percentile
+
+SAMPLE_RATE = 16_000
+
+def _resample(audio: np.ndarray, sr: int, target: int = SAMPLE_RATE) -> np.ndarray:
+    if sr == target or not len(audio):
+        return audio
+    try:
+        from math import gcd
+        from scipy.signal import resample_poly
+        g = gcd(sr, target)
+        return resample_poly(audio, target // g, sr // g).astype(np.float32)
+    except ImportError:
+        n = int(round(len(audio) * target / sr))
+        return np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+
+def _pcm_to_float(frames: bytes, width: int, channels: int) -> np.ndarray:
+    if width == 1:       # unsigned 8-bit
+        x = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:     # 24-bit little endian → top of an int32
+        b = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        x = (b[:, 0].astype(np.int32) << 8 | b[:, 1].astype(np.int32) << 16 | b[:, 2].astype(np.int32) << 24)
+        x = x.astype(np.float32) / 2**31
+    elif width == 4:
+        x = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"unsupported sample width {width}")
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1)
+    return x
+
+class AudioDecodeError(RuntimeError):
+    """Recorder bytes that are neither PCM WAV nor anything ffmpeg can decode."""
+
+def _ffmpeg_decode(audio_bytes: bytes, sr: int) -> np.ndarray:
+    """Any container/codec ffmpeg understands, via stdin/stdout pipes."""
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "pipe:1"]
+    try:
+        out = subprocess.run(cmd, input=audio_bytes, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise AudioDecodeError("audio is not PCM WAV and ffmpeg is not installed") from None
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"ffmpeg could not decode audio: {e.stderr.decode(errors='ignore')[-300:]}") from None
+    return np.frombuffer(out, dtype="<i2").astype(np.float32) / 32768.0
+
+def decode_audio(audio_bytes: bytes, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Recorder bytes → mono float32 in [-1, 1] at `sr` Hz."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as w:
+            frames = w.readframes(w.getnframes())
+            audio = _pcm_to_float(frames, w.getsampwidth(), w.getnchannels())
+            return _resample(audio, w.getframerate(), sr)
+    except (wave.Error, EOFError, ValueError):
+        return _ffmpeg_decode(audio_bytes, sr)
+
+class WhisperBackend:
+    name = "whisper"
+    concurrent = False   # whisper installs kv-cache hooks on the shared model per call
+
+    def __init__(self, size: str = WHISPER_SIZE, device: str | None = None):
+        import whisper
+        self.model = whisper.load_model(size, device=device)
+        self.fp16 = self.model.device.type == "cuda"
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        return (self.model.transcribe(audio, fp16=self.fp16).get("text") or "").strip()
+
+class CT2Backend:
+    """faster-whisper: CTranslate2 with int8 weights on CPU (several times faster than torch fp32)."""
+    name = "ct2"
+    concurrent = True
+
+    def __init__(self, size: str = WHISPER_SIZE, compute_type: str = "int8", num_workers: int = 1,
+                 cpu_threads: int = 0, beam_size: int = 5):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(size, device="cpu", compute_type=compute_type,
+                                  num_workers=num_workers, cpu_threads=cpu_threads)
+        self.beam_size = beam_size
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        segments, _ = self.model.transcribe(audio, beam_size=self.beam_size)
+        return "".join(s.text for s in segments).strip()
+
+def load_stt_backend(backend: str = STT_BACKEND, size: str = WHISPER_SIZE, workers: int = 1):
+    if backend == "whisper":
+        return WhisperBackend(size)
+    if backend == "ct2":
+        return CT2Backend(size, num_workers=workers)
+    raise ValueError(f"unknown STT backend {backend!r} (expected 'whisper' or 'ct2')")
+
+class STTService:
+    """Bounded request queue in front of `workers` transcription threads; submit() raises QueueFull when full."""
+
+    def __init__(self, backend, workers: int = 1, max_queue: int = 8, window: int = 512):
+        self.backend = backend
+        self.workers = workers
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._model_lock = None if getattr(backend, "concurrent", False) else threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.busy = 0
+        self.counts = {"ok": 0, "rejected": 0, "error": 0}
+        self.timings = {k: deque(maxlen=window) for k in ("wait", "decode", "transcribe", "total")}
+        self.audio_seconds = 0.0
+        self.compute_seconds = 0.0
+        self._threads = [threading.Thread(target=self._work, name=f"empathybot-stt-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, audio_bytes: bytes | np.ndarray) -> Future:
+        """Queue recorder bytes, or an already decoded 16 kHz float32 array (streaming chunks)."""
+        fut = Future()
+        if len(audio_bytes) == 0:
+            fut.set_result("")
+            return fut
+        try:
+            self.queue.put_nowait((audio_bytes, fut, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self.counts["rejected"] += 1
+            raise QueueFull()
+        return fut
+
+    def transcribe(self, audio_bytes: bytes | np.ndarray, timeout: float | None = None) -> str:
+        return self.submit(audio_bytes).result(timeout)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            audio_bytes, fut, t0 = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            with self._stats_lock:
+                self.busy += 1
+            try:
+                t1 = time.perf_counter()
+                audio = audio_bytes if isinstance(audio_bytes, np.ndarray) else decode_audio(audio_bytes)
+                dec = time.perf_counter() - t1
+                with self._model_lock or nullcontext():
+                    t2 = time.perf_counter()
+                    text = self.backend.transcribe(audio)
+                    t3 = time.perf_counter()
+            except Exception as e:
+                with self._stats_lock:
+                    self.busy -= 1
+                    self.counts["error"] += 1
+                fut.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.busy -= 1
+                self.counts["ok"] += 1
+                # wait: queued, plus waiting for the model lock on single-model backends
+                for key, dt in (("wait", t2 - t0 - dec), ("decode", dec), ("transcribe", t3 - t2), ("total", t3 - t0)):
+                    self.timings[key].append(dt)
+                self.audio_seconds += len(audio) / SAMPLE_RATE
+                self.compute_seconds += dec + t3 - t2
+            fut.set_result(text)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lat = {k: list(v) for k, v in self.timings.items()}
+            out = {
+                "backend": getattr(self.backend, "name", type(self.backend).__name__),
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "busy": self.busy,
+                "counts": dict(self.counts),
+                # compute time per second of audio; < 1 means faster than real time
+                "real_time_factor": round(self.compute_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            }
+        for key, v in lat.items():
+            out[f"{key}_ms"] = {"p50": round(percentile(v, 50) * 1000, 1) if v else None,
+                                "p99": round(percentile(v, 99) * 1000, 1) if v else None}
+        return out
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join()
@@ -0,0 +1,10 @@
+"""Small helpers shared by the server, the STT worker pool, routing stats and the benchmarks."""
+
+def percentile(values, q: float) -> float | None:
+    """Nearest-rank percentile (q in 0..100) of a small sample; None if empty."""
+    if not values: return None
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, round(q / 100 * len(s)) - 1))]
+
+class QueueFull(Exception):
+    """A bounded request queue is full (the server answers 503)."""
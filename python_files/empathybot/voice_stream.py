@@ -0,0 +1,222 @@
+"""
+Streaming voice input: VAD-gated chunks, incremental transcription, early warm-up.
+
+    vs = VoiceStream(stt)                       # stt: STTService (its worker pool runs the model)
+    for pcm in mic_chunks:                      # float32 16 kHz mono (or feed_pcm16(bytes))
+        for ev in vs.feed(pcm):
+            ...                                 # {"type": "partial", "text", ...} / {"type": "final", ...}
+    for ev in vs.finish(): ...
+
+Silence is dropped frame by frame (EnergyVAD), so Whisper only sees speech.
+While the user talks, the current utterance is re-transcribed every `step_s`
+of new speech; past `max_window_s` the window's text is committed and the next
+window starts `overlap_s` before its end, the repeated words being merged away.
+At most one transcription per stream is in flight, so a slow model drops
+intermediate partials instead of queueing behind them.
+
+Each partial text is handed to prewarm() on a side thread: emotion detection
+and retrieval run on it and land in the runtime caches, so when the final text
+matches the last partial respond() starts with both stages already done (and
+the models loaded either way). The latest detection rides along on partial
+events as detected_emotion / bucket / confidence.
+
+VoiceStream is a library API for front ends that have live microphone frames.
+Neither bundled front end can feed it: the Streamlit recorder hands over one
+blob after the user stops (Voice/voice_utils.py transcribes that), and
+serve.py does not load Whisper.
+"""
+import re, time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .stt import SAMPLE_RATE
+
+class EnergyVAD:
+    """
+    Frame-level speech/silence decision from RMS energy against an adaptive
+    noise floor. `hangover_ms` keeps trailing frames after speech so word
+    endings are not clipped.
+    """
+
+    def __init__(self, frame_ms: int = 30, min_db: float = -45.0, margin_db: float = 10.0,
+                 hangover_ms: int = 300, sr: int = SAMPLE_RATE):
+        self.frame = int(sr * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.min_db = min_db           # never call anything quieter than this speech
+        self.margin_db = margin_db     # speech must be this far above the noise floor
+        self.hangover = max(1, hangover_ms // frame_ms)
+        self.noise_db = min_db - 10.0
+        self._hang = 0
+
+    @staticmethod
+    def frame_db(frames: np.ndarray) -> np.ndarray:
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        return 20 * np.log10(np.maximum(rms, 1e-10))
+
+    def is_speech(self, audio: np.ndarray) -> np.ndarray:
+        """One bool per whole frame of `audio` (a trailing partial frame is ignored)."""
+        n = len(audio) // self.frame
+        if not n:
+            return np.zeros(0, dtype=bool)
+        db = self.frame_db(audio[:n * self.frame].reshape(n, self.frame))
+        out = np.zeros(n, dtype=bool)
+        for i, d in enumerate(db):
+            loud = d > max(self.min_db, self.noise_db + self.margin_db)
+            if not loud:   # track the floor on non-speech frames only (fast down, slow up)
+                self.noise_db = d if d < self.noise_db else 0.95 * self.noise_db + 0.05 * d
+            self._hang = self.hangover if loud else max(0, self._hang - 1)
+            out[i] = loud or self._hang > 0
+        return out
+
+def trim_silence(audio: np.ndarray, vad: EnergyVAD | None = None) -> np.ndarray:
+    """Speech frames of a whole recording (the blob recorder path)."""
+    vad = vad or EnergyVAD()
+    mask = vad.is_speech(audio)
+    if not mask.any():
+        return audio[:0]
+    frames = audio[:len(mask) * vad.frame].reshape(len(mask), vad.frame)
+    return frames[mask].reshape(-1)
+
+_WORD = re.compile(r"[\w']+")
+
+def merge_overlap(committed: str, new: str, max_words: int = 12) -> str:
+    """Append `new` to `committed`, dropping the words `new` repeats from the end of `committed`."""
+    if not committed:
+        return new.strip()
+    if not new.strip():
+        return committed
+    a = committed.split()
+    b = new.split()
+    norm = lambda ws: [" ".join(_WORD.findall(w.lower())) for w in ws]
+    na, nb = norm(a[-max_words:]), norm(b[:max_words])
+    for k in range(min(len(na), len(nb)), 0, -1):
+        if na[-k:] == nb[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+def prewarm(text: str):
+    """Detect + retrieve for `text` through the runtime caches; returns (label, bucket, confidence)."""
+    from . import runtime
+
+    raw_label, conf = runtime.detect_emotion_label_and_conf(text)
+    raw_label, bucket = runtime._bucket_for(text, raw_label, conf)
+    runtime.retrieve_top3(text, bucket)
+    return raw_label, bucket, conf
+
+class VoiceStream:
+    def __init__(self, stt, *, vad: EnergyVAD | None = None, step_s: float = 1.0, overlap_s: float = 0.5,
+                 max_window_s: float = 8.0, end_silence_ms: int = 700, warm=prewarm):
+        self.stt = stt                    # STTService (or anything with submit(np.ndarray) -> Future)
+        self.vad = vad or EnergyVAD()
+        self.step = int(step_s * SAMPLE_RATE)
+        self.overlap = int(overlap_s * SAMPLE_RATE)
+        self.max_window = int(max_window_s * SAMPLE_RATE)
+        self.end_frames = max(1, end_silence_ms // self.vad.frame_ms)
+        self.warm = warm
+        self._warm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="empathybot-prewarm") if warm else None
+        self._warm_fut = None
+        self.emotion = None               # latest (label, bucket, confidence) from prewarm
+        self.t0 = time.perf_counter()
+        self._reset()
+
+    def _reset(self):
+        self._pending = np.zeros(0, dtype=np.float32)   # samples not yet VAD-classified (< one frame)
+        self._speech: list[np.ndarray] = []             # speech frames of the current utterance
+        self._n_speech = 0
+        self._win_start = 0          # utterance sample where the current window begins
+        self._last_submit = 0        # utterance length at the last submitted transcription
+        self._silent = 0             # consecutive non-speech frames
+        self._committed = ""
+        self._partial = ""
+        self._inflight = None        # (future, window end, commits?)
+
+    def _utterance(self) -> np.ndarray:
+        if len(self._speech) > 1:
+            self._speech = [np.concatenate(self._speech)]
+        return self._speech[0] if self._speech else np.zeros(0, dtype=np.float32)
+
+    def _event(self, kind: str, text: str) -> dict:
+        self._poll_warm()
+        ev = {"type": kind, "text": text, "t": round(time.perf_counter() - self.t0, 3)}
+        if self.emotion:
+            label, bucket, conf = self.emotion
+            ev.update(detected_emotion=label, bucket=bucket, confidence=round(conf, 3))
+        return ev
+
+    def _submit(self, final: bool = False):
+        audio = self._utterance()
+        end = len(audio)
+        commit = final or end - self._win_start >= self.max_window
+        self._inflight = (self.stt.submit(audio[self._win_start:end]), end, commit)
+        self._last_submit = end
+
+    def _collect(self, block: bool = False) -> list[dict]:
+        if self._inflight is None or not (block or self._inflight[0].done()):
+            return []
+        fut, end, commit = self._inflight
+        self._inflight = None
+        text = merge_overlap(self._committed, fut.result())
+        if commit:
+            self._committed = text
+            self._win_start = max(0, end - self.overlap)
+        if text == self._partial:
+            return []
+        self._partial = text
+        self._start_warm(text)
+        return [self._event("partial", text)]
+
+    def _poll_warm(self):
+        if self._warm_fut is not None and self._warm_fut.done():
+            try:
+                self.emotion = self._warm_fut.result()
+            except Exception:
+                pass   # warm-up is best effort; respond() will detect again
+            self._warm_fut = None
+
+    def _start_warm(self, text: str):
+        if self._warm_pool is None:
+            return
+        self._poll_warm()
+        if self._warm_fut is None:         # at most one in flight; newer partials supersede
+            self._warm_fut = self._warm_pool.submit(self.warm, text)
+
+    def feed(self, pcm: np.ndarray) -> list[dict]:
+        """Add float32 16 kHz mono samples; returns the events that became ready."""
+        events = self._collect()
+        audio = np.concatenate([self._pending, np.asarray(pcm, dtype=np.float32)])
+        mask = self.vad.is_speech(audio)
+        n = len(mask) * self.vad.frame
+        self._pending = audio[n:]
+        frames = audio[:n].reshape(len(mask), self.vad.frame) if len(mask) else audio[:0].reshape(0, self.vad.frame)
+        for frame, speech in zip(frames, mask):
+            if speech:
+                self._speech.append(frame)
+                self._n_speech += len(frame)
+                self._silent = 0
+            else:
+                self._silent += 1
+        if self._n_speech and self._silent >= self.end_frames:
+            events += self._end_utterance()
+        elif self._inflight is None and self._n_speech - self._last_submit >= self.step:
+            self._submit()
+        return events
+
+    def feed_pcm16(self, data: bytes) -> list[dict]:
+        return self.feed(np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0)
+
+    def _end_utterance(self) -> list[dict]:
+        events = self._collect(block=True)
+        if self._n_speech > self._last_submit or not self._partial:
+            self._submit(final=True)
+            events += self._collect(block=True)
+        text = self._partial
+        self._reset()
+        return events + ([self._event("final", text)] if text else [])
+
+    def finish(self) -> list[dict]:
+        """End of input: flush the current utterance."""
+        events = self._end_utterance() if self._n_speech else []
+        if self._warm_pool is not None:
+            self._warm_pool.shutdown(wait=False)
+        return events
@@ -14,8 +14,8 @@ if MODULE_DIR not in sys.path:
 
 # ---------- Import your core pipeline & helpers ----------
 import empathybot_sprint_py as core
-from empathybot_sprint_py import respond as core_respond, emo_pipe, vstore, llm
-from voice_utils import load_stt, transcribe_audio_bytes
+from empathybot_sprint_py import respond as core_respond
+from voice_utils import load_stt, transcribe_audio_bytes, prewarm_async
 from ui_utils import emotion_badge_html
 
 # ---------- Robust ROOT/DATA paths ----------
@@ -31,15 +31,17 @@ FEEDBACK_LOG = DATA_DIR / "feedback.jsonl"
 # Your corpus path (in sample_data)
 CORPUS_CLEAN = Path("/content/sample_data/corpus_clean.json")
 
+# Turns kept on screen; the bot's own memory of the conversation lives in core (keyed by session_id)
+MAX_HISTORY_TURNS = 20
+
 # ---------- Adapter: call your respond() without changing its signature ----------
-def respond_adapter(user_text: str, tone: str = "warm"):
-    try:
-        out = core_respond(user_text, emo_pipe=emo_pipe, vstore=vstore, llm=llm, tone=tone)
-    except TypeError:
-        try:
-            out = core_respond(user_text, tone=tone)
-        except TypeError:
-            out = core_respond(user_text)
+@st.cache_resource(show_spinner="Loading models…")
+def load_core():
+    """Load detector/retriever/generator once per server process (import itself is cheap)."""
+    core.init()
+    return True
+
+def _as_payload(out):
     if isinstance(out, str):
         out = {"reply": out}
     return {
@@ -51,6 +53,30 @@ def respond_adapter(user_text: str, tone: str = "warm"):
         "prompt": out.get("prompt", None),
     }
 
+def respond_adapter(user_text: str, tone: str = "warm", session_id: str | None = None):
+    load_core()
+    try:
+        out = core_respond(user_text, session_id=session_id)
+    except TypeError:
+        out = core_respond(user_text)
+    return _as_payload(out)
+
+def respond_streaming(user_text: str, session_id: str | None = None):
+    """Show the emotion badge right away, then the reply as it is generated."""
+    load_core()
+    badge, bubble = st.empty(), st.empty()
+    shown, out = "", {}
+    for ev in core.respond_stream(user_text, session_id=session_id):
+        if ev["type"] == "meta":
+            badge.markdown(emotion_badge_html(ev["detected_emotion"], ev["bucket"], ev["confidence"]),
+                           unsafe_allow_html=True)
+        elif ev["type"] == "delta":
+            shown += ev["text"]
+            bubble.markdown(f"<div class='chat-bubble-bot'>{shown}▌</div>", unsafe_allow_html=True)
+        else:
+            out = ev
+    return _as_payload(out)
+
 # ---------- Page setup & decorative styles ----------
 st.set_page_config(page_title="EmpathyBot — Emotion-Aware RAG", page_icon="🤝", layout="wide")
 st.markdown("""
@@ -117,6 +143,8 @@ if "user_text" not in st.session_state:
     st.session_state.user_text = ""
 if "show_recorder" not in st.session_state:
     st.session_state.show_recorder = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # ---------- Input row: text input + mic + send ----------
 col1, col2, col3 = st.columns([7,1,1], gap="small")
@@ -148,6 +176,7 @@ if st.session_state.show_recorder:
             stt_model = load_stt()  # env WHISPER_SIZE or 'base'
             transcript = transcribe_audio_bytes(audio_bytes, stt_model)
         if transcript:
+            prewarm_async(transcript)   # detect/retrieve while the user reviews the text
             st.session_state.user_text = transcript
             st.success("Transcribed! You can edit the text and click Send.")
             st.session_state.show_recorder = False
@@ -161,10 +190,15 @@ if send_clicked:
     if not text:
         st.warning("Please type a message or use the mic to record.")
     else:
-        with st.spinner("Thinking empathetically…"):
-            out = respond_adapter(text, tone=tone)
+        sid = st.session_state.session_id
+        if hasattr(core, "respond_stream"):
+            out = respond_streaming(text, session_id=sid)
+        else:
+            with st.spinner("Thinking empathetically…"):
+                out = respond_adapter(text, tone=tone, session_id=sid)
         st.session_state.chat.append(("user", text))
         st.session_state.chat.append(("bot", out))
+        del st.session_state.chat[:-2 * MAX_HISTORY_TURNS]
         st.session_state.user_text = ""
         st.rerun()
 
@@ -0,0 +1,64 @@
+import pytest
+
+from empathybot.generator import IncrementalPostprocessor, postprocess
+
+USER = "my week has been rough"
+
+RAW = [
+    "I am sorry. I am sorry. What happened?",
+    "Do not worry… it will pass.",
+    "That sounds hard.\nTemplates: i'm sorry | what happened\nWhat happened next?",
+    "That sounds hard.\nWhat happened next? Do not paraphrase.",
+    "That sounds hard. That sounds hard! That sounds hard. Want to talk?",
+    "That sounds hard\nfor you. How are you holding up?",
+    "User: my week\nEmotion: sadness\nReply: I'm sorry I'm sorry, that is a lot. How are you?",
+    "  \n\nThat is great news!\n\nwhat made it work?  ",
+    "I hear you. I HEAR YOU. i hear you.\nWhy?",
+    "No punctuation at all here",
+    "",
+]
+
+def chunkings(raw):
+    yield [raw]
+    yield list(raw)
+    yield [w + " " for w in raw.split(" ")[:-1]] + raw.split(" ")[-1:]
+
+def run(chunks):
+    pp = IncrementalPostprocessor(USER)
+    shown = ""
+    for chunk in chunks:
+        shown += pp.feed(chunk)
+        if pp.done:
+            break
+    return pp, shown + pp.finish()
+
+@pytest.mark.parametrize("raw", RAW)
+def test_stream_matches_postprocess(raw):
+    for chunks in chunkings(raw):
+        pp, shown = run(chunks)
+        assert shown == postprocess(pp.raw, USER)
+
+@pytest.mark.parametrize("raw", RAW)
+def test_stream_prefix_is_never_retracted(raw):
+    # every intermediate state is a prefix of the final reply for the text consumed so far
+    pp, shown = IncrementalPostprocessor(USER), ""
+    for ch in raw:
+        shown += pp.feed(ch)
+        assert postprocess(pp.raw, USER).startswith(shown)
+        if pp.done:
+            break
+
+def test_meta_and_duplicates_are_not_streamed():
+    assert run(list("Do not worry… it will pass."))[1] == ""
+    assert run(list("I am sorry. I am sorry. What happened?"))[1] == "I am sorry. What happened?"
+
+def test_stops_after_two_distinct_sentences():
+    pp, shown = run(list("Sorry. Sorry. That hurts. What happened? More text"))
+    assert pp.done and shown == "Sorry. That hurts."
+    assert not pp.raw.endswith("More text")
+
+def test_ended_lines_are_released_before_generation_stops():
+    pp = IncrementalPostprocessor(USER)
+    assert pp.feed("That sounds hard.") == ""      # the line may still turn into a meta line
+    assert pp.feed("\nWhat") == "That sounds hard."
+    assert pp.feed(" happened? ") == " What happened?" and pp.done
@@ -0,0 +1,27 @@
+import time
+
+from empathybot.memory import SQLiteSessionStore
+
+def test_sqlite_store_purges_expired_sessions(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=60, max_sessions=None)
+    store.put("old", b"{}")
+    store._db.execute("UPDATE sessions SET updated = ? WHERE id = 'old'", (time.time() - 120,))
+    store.put("new", b"{}")
+    assert store.purge() == 1
+    assert len(store) == 1 and store.get("old") is None and store.get("new") == b"{}"
+
+def test_sqlite_store_caps_sessions_on_write(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=None, max_sessions=3, purge_every=1)
+    for i in range(10):
+        store.put(f"s{i}", b"{}")
+        time.sleep(0.001)   # distinct `updated` values
+    assert len(store) == 3
+    assert [store.get(f"s{i}") is not None for i in range(10)] == [False] * 7 + [True] * 3
+
+def test_sqlite_store_purges_periodically(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=None, max_sessions=2, purge_every=4)
+    for i in range(4):
+        store.put(f"s{i}", b"{}")
+    assert len(store) == 4          # first write purged an empty table; next purge is due on write 5
+    store.put("s4", b"{}")
+    assert len(store) == 2
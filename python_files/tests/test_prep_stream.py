@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from empathybot.prep_stream import ArrowSource, PrepRun
+
+def test_export_without_parts_replaces_previous_output(tmp_path):
+    src = tmp_path / "in.csv"
+    pd.DataFrame({"text": ["i am so happy today", "this is awful"], "label": [1, 0]}).to_csv(src, index=False)
+    run = PrepRun(tmp_path / "parts", batch_size=10)
+    run.add(ArrowSource.from_csv(src, {0: "sadness", 1: "joy"}))
+    out_pq, out_csv = tmp_path / "merged.parquet", tmp_path / "merged.csv"
+    assert run.export(out_pq, out_csv) == 2
+
+    empty = PrepRun(tmp_path / "empty_parts", batch_size=10)
+    assert empty.export(out_pq, out_csv) == 0
+    assert pd.read_parquet(out_pq).empty and pd.read_csv(out_csv).empty
+
+def test_prepare_files_accepts_label_name_only_input(tmp_path):
+    from empathybot.prep import prepare_files
+
+    src = tmp_path / "named.csv"
+    pd.DataFrame({"text": ["i am so happy today", "this is awful"], "label_name": ["joy", "sadness"]}).to_csv(src, index=False)
+    jsonl = tmp_path / "named.jsonl"
+    jsonl.write_text('{"text": "why would they do that", "label_name": "anger"}\n', encoding="utf-8")
+    report = prepare_files([src, jsonl], tmp_path / "out", export=True)
+    assert report["rows"] == 3
+    df = pd.read_parquet(tmp_path / "out" / "merged_clean.parquet")
+    assert df["label"].isna().all() and list(df["label_4"]) == ["happiness", "sadness", "anger"]
+
+def test_prepare_files_rejects_unnamed_label_ids(tmp_path):
+    from empathybot.prep import prepare_files
+
+    src = tmp_path / "ids.csv"
+    pd.DataFrame({"text": ["i am so happy today", "this is awful"], "label": [1, 0]}).to_csv(src, index=False)
+    with pytest.raises(ValueError, match="label ids"):
+        prepare_files([src], tmp_path / "out")
+    with pytest.raises(ValueError, match=r"\[1\]"):
+        prepare_files([src], tmp_path / "out2", label_names=["sadness"])
+    report = prepare_files([src], tmp_path / "out3", label_names=["sadness", "joy"])
+    assert report["label_4"] == {"happiness": 1, "sadness": 1}
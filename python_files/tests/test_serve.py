@@ -0,0 +1,47 @@
+import asyncio, json
+
+import pytest
+
+from empathybot.serve import MAX_K, EmpathyServer
+
+class _Writer:
+    def __init__(self):
+        self.data = b""
+    def write(self, data):
+        self.data += data
+    async def drain(self):
+        pass
+    def close(self):
+        pass
+
+def _respond(body: dict) -> tuple[int, dict]:
+    server = EmpathyServer(batcher=None)   # validation fails before anything is submitted
+    return asyncio.run(server.route("POST", "/respond", json.dumps(body).encode()))
+
+@pytest.mark.parametrize("extra", [
+    {"k": "x"}, {"k": 0}, {"k": -2}, {"k": None}, {"k": 1e999},
+    {"k": 2.7}, {"k": True}, {"k": "5"}, {"k": 1_000_000_000}, {"k": MAX_K + 1},
+    {"timeout": "soon"}, {"timeout": 0}, {"timeout": -1}, {"timeout": 1e999},
+    {"force_emotion": 3}, {"force_emotion": ["sadness"]},
+])
+def test_respond_rejects_bad_parameters(extra):
+    status, payload = _respond({"message": "hi there", **extra})
+    assert status == 400 and payload["error"].startswith("bad request")
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1.5"])
+def test_bad_content_length_is_400(length):
+    async def go():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /respond HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+        reader.feed_eof()
+        writer = _Writer()
+        await EmpathyServer(batcher=None).handle(reader, writer)
+        return writer.data
+    data = asyncio.run(go())
+    assert data.startswith(b"HTTP/1.1 400 ") and b"Connection: close" in data
+
+@pytest.mark.parametrize("seconds", ["-1", "0", "abc", "nan", "61"])
+def test_profile_rejects_bad_seconds(seconds):
+    server = EmpathyServer(batcher=None, profiling=True)
+    status, payload = asyncio.run(server.route("GET", "/debug/profile", b"", f"seconds={seconds}"))
+    assert status == 400 and "seconds" in payload["error"]